@@ -46,6 +46,8 @@ find "$INPUT" -type f \( -name "*.btf" -o -name "*.ome.btf" \) 2>/dev/null | sor
 
 echo "--- VSI FILES ---"
 BFCONVERT="$HOME/bin/bftools/bftools/bfconvert"
+# The intermediate TIFF is deleted after extraction; skip LZW unless temp space is tight
+TEMP_COMPRESSION="${TEMP_COMPRESSION:-Uncompressed}"
 if [[ -x "$BFCONVERT" ]]; then
     TEMP=$(mktemp -d)
     trap "rm -rf $TEMP" EXIT
@@ -63,7 +65,7 @@ if [[ -x "$BFCONVERT" ]]; then
 
         echo "[START VSI] $base"
         tmp="$TEMP/${stem}.ome.tiff"
-        if timeout 3600 "$BFCONVERT" -bigtiff -compression LZW -tilex 512 -tiley 512 -series 0 "$f" "$tmp" 2>&1 | tail -5; then
+        if timeout 3600 "$BFCONVERT" -bigtiff -compression "$TEMP_COMPRESSION" -tilex 1024 -tiley 1024 -series 0 "$f" "$tmp" 2>&1 | tail -5; then
             if timeout 10800 uv run python btf_to_green.py "$tmp" "$OUTPUT" --channel 1 2>&1 | grep -v "OME series"; then
                 if [[ -f "$out" ]]; then
                     echo "[DONE] $base ($(du -h "$out" | cut -f1))"
@@ -92,6 +92,8 @@ done
 
 # Process VSI files (if bfconvert exists)
 BFCONVERT="$HOME/bin/bftools/bftools/bfconvert"
+# The intermediate TIFF is deleted after extraction; skip LZW unless temp space is tight
+TEMP_COMPRESSION="${TEMP_COMPRESSION:-Uncompressed}"
 if [[ -x "$BFCONVERT" ]]; then
     log "=== Processing VSI files ==="
 
@@ -112,7 +114,7 @@ if [[ -x "$BFCONVERT" ]]; then
         temp_tiff="$TEMP_DIR/${basename}.ome.tiff"
 
         # Convert VSI to TIFF
-        if timeout 3600 "$BFCONVERT" -bigtiff -compression LZW -tilex 512 -tiley 512 -series 0 "$vsi_file" "$temp_tiff" >> "$LOG_FILE" 2>&1; then
+        if timeout 3600 "$BFCONVERT" -bigtiff -compression "$TEMP_COMPRESSION" -tilex 1024 -tiley 1024 -series 0 "$vsi_file" "$temp_tiff" >> "$LOG_FILE" 2>&1; then
             # Extract green channel
             if timeout 1800 uv run python btf_to_green.py "$temp_tiff" "$OUTPUT_DIR" --channel 1 >> "$LOG_FILE" 2>&1; then
                 if [[ -f "$output_file" ]]; then
@@ -15,9 +15,83 @@ Usage:
 import argparse
 import csv
 import math
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import numpy as np
 import tifffile
-from pathlib import Path
+
+from cellprofiler_tools.converters.tiff_io import advise_sequential, drop_input_cache
+
+# Per-nucleus output columns, in CSV order
+RESULT_FIELDS = (
+    'ObjectNumber', 'Center_X', 'Center_Y', 'Area_pixels', 'True_IOD',
+    'Mean_OD', 'Max_OD', 'Background_I0', 'CellProfiler_IntegratedIntensity',
+)
+
+
+def load_channel(image_path: str, channel: int = 1, block_rows: int = 2048) -> np.ndarray:
+    """
+    Load one channel of an RGB TIFF without reading the whole image into RAM.
+
+    Grayscale images are returned as-is, memory-mapped read-only if
+    uncompressed. For RGB, uncompressed images are memory-mapped and the
+    channel copied out; compressed ones are read through a zarr store in row
+    blocks aligned to the TIFF strips/tiles, so only the selected channel
+    (a third of the data) is ever held in memory. Planar RGB (one plane per
+    channel) only reads the selected plane from disk.
+
+    Args:
+        image_path: Path to the image file
+        channel: Channel to keep for RGB images (default 1, green)
+        block_rows: Approximate rows to decode at a time
+
+    Returns:
+        2D array of the selected channel
+    """
+    with tifffile.TiffFile(image_path) as tif:
+        # The file is read once, front to back: enlarge readahead, and drop
+        # its pages from the cache afterwards
+        advise_sequential(tif)
+        image = read_channel(tif, channel, block_rows)
+        # A memmap is read from those pages later, so they must stay
+        if not isinstance(image, np.memmap):
+            drop_input_cache(tif)
+        return image
+
+
+def read_channel(tif: tifffile.TiffFile, channel: int, block_rows: int) -> np.ndarray:
+    """Read one channel of the first page of an open TIFF (see load_channel)."""
+    page = tif.pages[0]
+    if page.samplesperpixel == 1:
+        # Uncompressed grayscale is used in place, paged in as it is read
+        return page.asarray(out='memmap') if page.is_memmappable else page.asarray()
+
+    planar = page.planarconfig == tifffile.PLANARCONFIG.SEPARATE
+    if page.is_memmappable:
+        mapped = page.asarray(out='memmap')
+        return np.array(mapped[channel] if planar else mapped[:, :, channel])
+
+    # Align blocks to whole strips/tiles so none is decoded twice
+    chunk_rows = page.chunks[1 if planar else 0]
+    block_rows = max(1, block_rows // chunk_rows) * chunk_rows
+
+    height, width = page.imagelength, page.imagewidth
+    image = np.empty((height, width), dtype=page.dtype)
+    # zarr takes ~0.3 s to import; memory-mapped inputs never need it
+    import zarr
+
+    store = page.aszarr()
+    try:
+        z = zarr.open(store, mode='r')
+        for y in range(0, height, block_rows):
+            if planar:
+                image[y:y + block_rows] = z[channel, y:y + block_rows, :]
+            else:
+                image[y:y + block_rows] = z[y:y + block_rows, :, channel]
+    finally:
+        store.close()
+
+    return image
 
 
 def estimate_background(image: np.ndarray, percentile: float = 95) -> float:
@@ -59,6 +133,20 @@ def calculate_pixel_od(pixel_value: float, background: float, epsilon: float = 1
     return math.log10(background / pixel_value)
 
 
+def calculate_od(pixels: np.ndarray, background: float, epsilon: float = 1.0) -> np.ndarray:
+    """
+    Calculate optical density for an array of pixels at once.
+
+    Same result as calculate_pixel_od applied to each pixel, without a
+    Python call per pixel.
+    """
+    pixels = np.maximum(pixels.astype(np.float64), epsilon)
+    od = np.zeros_like(pixels)
+    absorbing = pixels < background
+    od[absorbing] = np.log10(background / pixels[absorbing])
+    return od
+
+
 def calculate_nucleus_iod(image: np.ndarray, center_x: float, center_y: float,
                           area: float, background: float) -> dict:
     """
@@ -84,25 +172,49 @@ def calculate_nucleus_iod(image: np.ndarray, center_x: float, center_y: float,
     nucleus_pixels = image[mask]
 
     if len(nucleus_pixels) == 0:
-        return {'IOD': 0, 'MeanOD': 0, 'PixelCount': 0}
+        return {'IOD': 0, 'MeanOD': 0, 'PixelCount': 0, 'MaxOD': 0, 'MinOD': 0}
 
     # Calculate OD for each pixel and sum (IOD)
-    od_values = [calculate_pixel_od(float(p), background) for p in nucleus_pixels]
-    iod = sum(od_values)
-    mean_od = iod / len(od_values) if od_values else 0
+    od_values = calculate_od(nucleus_pixels, background)
+    iod = float(od_values.sum())
+    mean_od = iod / len(od_values)
 
     return {
         'IOD': iod,
         'MeanOD': mean_od,
         'PixelCount': len(nucleus_pixels),
-        'MaxOD': max(od_values) if od_values else 0,
-        'MinOD': min(od_values) if od_values else 0
+        'MaxOD': float(od_values.max()),
+        'MinOD': float(od_values.min())
     }
 
 
+def nucleus_window(image: np.ndarray, center_x: float, center_y: float,
+                   area: float) -> tuple[np.ndarray, float, float]:
+    """
+    Crop the bounding box of a nucleus' circular mask out of the image.
+
+    Returns (window, center_x, center_y) with the center shifted into
+    window coordinates, so calculate_nucleus_iod gives the same result on
+    the window as on the full image.
+    """
+    radius = int(math.sqrt(area / math.pi))
+    cx, cy = int(center_x), int(center_y)
+    x0, y0 = max(cx - radius, 0), max(cy - radius, 0)
+    window = image[y0:max(cy + radius + 1, 0), x0:max(cx + radius + 1, 0)]
+    return window, center_x - x0, center_y - y0
+
+
+def calculate_batch_iod(windows: list, background: float) -> list[dict]:
+    """Calculate true IOD for a batch of (window, center_x, center_y, area) nuclei."""
+    return [calculate_nucleus_iod(window, cx, cy, area, background)
+            for window, cx, cy, area in windows]
+
+
 def process_image(image_path: str, nuclei_csv: str, output_csv: str,
                   background_percentile: float = 95,
-                  trim_percent: float = 5.0):
+                  trim_percent: float = 5.0,
+                  jobs: int = 1,
+                  batch_size: int = 256):
     """
     Process an image and calculate true IOD for all nuclei.
 
@@ -112,14 +224,18 @@ def process_image(image_path: str, nuclei_csv: str, output_csv: str,
         output_csv: Path for output CSV with true IOD
         background_percentile: Percentile for background estimation
         trim_percent: Percent to trim from top/bottom of IOD values (QC)
+        jobs: Worker processes for the per-nucleus IOD (default: 1; the
+            vectorized IOD is fast enough that pickling windows to workers
+            only pays off for very large nucleus counts)
+        batch_size: Nuclei sent to a worker at a time
+
+    Returns:
+        One dict per nucleus that passed QC (output CSV columns), in IOD order
     """
     # Load image
     print(f"Loading image: {image_path}")
-    image = tifffile.imread(image_path)
-
-    if image.ndim == 3:
-        # If RGB, use green channel
-        image = image[:, :, 1]
+    # If RGB, only the green channel is read
+    image = load_channel(image_path, channel=1)
 
     # Estimate background
     background = estimate_background(image, background_percentile)
@@ -132,46 +248,61 @@ def process_image(image_path: str, nuclei_csv: str, output_csv: str,
 
     print(f"Processing {len(nuclei)} nuclei...")
 
-    # Calculate true IOD for each nucleus
-    results = []
+    # Nuclei are independent: only each one's bounding box is sent to a
+    # worker, in batches, so the image itself is never copied between processes
+    windows = []
     for n in nuclei:
         cx = float(n['AreaShape_Center_X'])
         cy = float(n['AreaShape_Center_Y'])
         area = float(n['AreaShape_Area'])
+        window, wx, wy = nucleus_window(image, cx, cy, area)
+        windows.append((window, wx, wy, area))
+    batches = [windows[i:i + batch_size] for i in range(0, len(windows), batch_size)]
+
+    if jobs > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(batches))) as executor:
+            batch_results = list(executor.map(calculate_batch_iod, batches, repeat(background)))
+    else:
+        batch_results = [calculate_batch_iod(batch, background) for batch in batches]
+    iod_results = [r for batch in batch_results for r in batch]
 
-        iod_data = calculate_nucleus_iod(image, cx, cy, area, background)
+    # Collect results, one list per output column
+    columns = {name: [] for name in RESULT_FIELDS}
+    for n, iod_data in zip(nuclei, iod_results):
+        cx = float(n['AreaShape_Center_X'])
+        cy = float(n['AreaShape_Center_Y'])
+        area = float(n['AreaShape_Area'])
 
-        results.append({
-            'ObjectNumber': n['ObjectNumber'],
-            'Center_X': cx,
-            'Center_Y': cy,
-            'Area_pixels': area,
-            'True_IOD': iod_data['IOD'],
-            'Mean_OD': iod_data['MeanOD'],
-            'Max_OD': iod_data['MaxOD'],
-            'Background_I0': background,
-            'CellProfiler_IntegratedIntensity': n.get('Intensity_IntegratedIntensity_OrigGreen', 'N/A')
-        })
+        columns['ObjectNumber'].append(n['ObjectNumber'])
+        columns['Center_X'].append(cx)
+        columns['Center_Y'].append(cy)
+        columns['Area_pixels'].append(area)
+        columns['True_IOD'].append(iod_data['IOD'])
+        columns['Mean_OD'].append(iod_data['MeanOD'])
+        columns['Max_OD'].append(iod_data['MaxOD'])
+        columns['Background_I0'].append(background)
+        columns['CellProfiler_IntegratedIntensity'].append(
+            n.get('Intensity_IntegratedIntensity_OrigGreen', 'N/A'))
 
     # Sort by IOD for QC filtering
-    results.sort(key=lambda x: x['True_IOD'])
-    n_total = len(results)
+    iod = np.asarray(columns['True_IOD'], dtype=np.float64)
+    order = np.argsort(iod, kind='stable')
+    n_total = len(order)
 
     # Apply QC: remove top and bottom trim_percent
     if trim_percent > 0 and n_total > 10:
         trim_n = int(n_total * trim_percent / 100)
-        results_qc = results[trim_n:-trim_n] if trim_n > 0 else results
+        qc_order = order[trim_n:-trim_n] if trim_n > 0 else order
         print(f"QC: Removed {trim_n} from top and bottom ({trim_percent}%)")
-        print(f"Retained {len(results_qc)} of {n_total} nuclei")
+        print(f"Retained {len(qc_order)} of {n_total} nuclei")
     else:
-        results_qc = results
+        qc_order = order
 
     # Calculate summary statistics
-    iod_values = [r['True_IOD'] for r in results_qc]
-    if iod_values:
-        mean_iod = sum(iod_values) / len(iod_values)
-        variance = sum((x - mean_iod)**2 for x in iod_values) / len(iod_values)
-        std_iod = math.sqrt(variance)
+    iod_values = iod[qc_order]
+    if len(iod_values):
+        mean_iod = float(iod_values.mean())
+        std_iod = float(iod_values.std())
         cv = (std_iod / mean_iod * 100) if mean_iod > 0 else 0
 
         print(f"\n=== IOD Summary (after QC) ===")
@@ -179,22 +310,21 @@ def process_image(image_path: str, nuclei_csv: str, output_csv: str,
         print(f"Mean IOD: {mean_iod:.2f}")
         print(f"Std IOD: {std_iod:.2f}")
         print(f"CV: {cv:.1f}%")
-        print(f"Range: {min(iod_values):.2f} - {max(iod_values):.2f}")
+        print(f"Range: {iod_values.min():.2f} - {iod_values.max():.2f}")
 
-    # Write output CSV
+    # Write output CSV in IOD order
+    qc_passed = np.zeros(n_total, dtype=bool)
+    qc_passed[qc_order] = True
     with open(output_csv, 'w', newline='') as f:
-        fieldnames = list(results[0].keys()) + ['QC_Passed']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-
-        qc_set = set(r['ObjectNumber'] for r in results_qc)
-        for r in results:
-            r['QC_Passed'] = 'Yes' if r['ObjectNumber'] in qc_set else 'No'
-            writer.writerow(r)
+        writer = csv.writer(f)
+        writer.writerow(RESULT_FIELDS + ('QC_Passed',))
+        for i in order:
+            writer.writerow([columns[name][i] for name in RESULT_FIELDS]
+                            + ['Yes' if qc_passed[i] else 'No'])
 
     print(f"\nResults saved to: {output_csv}")
 
-    return results_qc
+    return [{**{name: columns[name][i] for name in RESULT_FIELDS}, 'QC_Passed': 'Yes'} for i in qc_order]
 
 
 def main():
@@ -208,6 +338,8 @@ def main():
                         help="Percentile for background estimation (default: 95)")
     parser.add_argument("--trim-percent", type=float, default=5.0,
                         help="Percent to trim from top/bottom for QC (default: 5)")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Worker processes for per-nucleus IOD (default: 1)")
 
     args = parser.parse_args()
 
@@ -216,7 +348,8 @@ def main():
         args.nuclei_csv,
         args.output_csv,
         args.background_percentile,
-        args.trim_percent
+        args.trim_percent,
+        args.jobs
     )
 
 
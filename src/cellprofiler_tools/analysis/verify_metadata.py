@@ -14,11 +14,20 @@ Usage:
 """
 
 import argparse
+import json
 import subprocess
 import sys
 import xml.etree.ElementTree as ET
 from pathlib import Path
 
+try:
+    import tifffile
+except ImportError:
+    # Not installed for this interpreter; fall back to the uv environment
+    tifffile = None
+
+from cellprofiler_tools.common import scan_files
+
 # Bio-Formats showinf path
 SHOWINF = Path.home() / "bin" / "bftools" / "bftools" / "showinf"
 
@@ -43,109 +52,97 @@ def get_ome_xml(file_path: Path) -> str | None:
         return None
 
 
-def try_tifffile(file_path: Path) -> dict | None:
-    """Try to read metadata using tifffile, including parsing OME-XML."""
-    try:
-        # Use uv run to access tifffile in the virtual environment
-        result = subprocess.run(
-            ["uv", "run", "python", "-c", f"""
-import tifffile
-import json
-import xml.etree.ElementTree as ET
+def read_tiff_metadata(file_path: Path) -> dict:
+    """Read resolution tags and OME-XML metadata with tifffile."""
+    with tifffile.TiffFile(file_path) as tif:
+        page = tif.pages[0]
+        meta = {}
+
+        # Get resolution from TIFF tags
+        if hasattr(page, 'tags'):
+            tags = page.tags
+            if 'XResolution' in tags:
+                xres = tags['XResolution'].value
+                if isinstance(xres, tuple):
+                    meta['x_resolution'] = xres[0] / xres[1] if xres[1] else 0
+            if 'YResolution' in tags:
+                yres = tags['YResolution'].value
+                if isinstance(yres, tuple):
+                    meta['y_resolution'] = yres[0] / yres[1] if yres[1] else 0
+            if 'ResolutionUnit' in tags:
+                unit = tags['ResolutionUnit'].value
+                meta['resolution_unit'] = str(unit)
+
+        # Get OME-XML if present and parse it
+        if tif.ome_metadata:
+            meta['has_ome'] = True
+            ome_xml = tif.ome_metadata
+            try:
+                xml_start = ome_xml.find("<?xml")
+                if xml_start < 0:
+                    xml_start = ome_xml.find("<OME")
+                if xml_start >= 0:
+                    ome_xml = ome_xml[xml_start:]
 
-with tifffile.TiffFile('{file_path}') as tif:
-    page = tif.pages[0]
-    meta = {{}}
-
-    # Get resolution from TIFF tags
-    if hasattr(page, 'tags'):
-        tags = page.tags
-        if 'XResolution' in tags:
-            xres = tags['XResolution'].value
-            if isinstance(xres, tuple):
-                meta['x_resolution'] = xres[0] / xres[1] if xres[1] else 0
-        if 'YResolution' in tags:
-            yres = tags['YResolution'].value
-            if isinstance(yres, tuple):
-                meta['y_resolution'] = yres[0] / yres[1] if yres[1] else 0
-        if 'ResolutionUnit' in tags:
-            unit = tags['ResolutionUnit'].value
-            meta['resolution_unit'] = str(unit)
-
-    # Get OME-XML if present and parse it
-    if tif.ome_metadata:
-        meta['has_ome'] = True
-        ome_xml = tif.ome_metadata
-        try:
-            xml_start = ome_xml.find("<?xml")
-            if xml_start < 0:
-                xml_start = ome_xml.find("<OME")
-            if xml_start >= 0:
-                ome_xml = ome_xml[xml_start:]
-
-            root = ET.fromstring(ome_xml)
-
-            # Try different namespaces
-            for ns in [
-                {{"ome": "http://www.openmicroscopy.org/Schemas/OME/2016-06"}},
-                {{"ome": "http://www.openmicroscopy.org/Schemas/OME/2015-01"}},
-                {{}},
-            ]:
-                pixels = root.find(".//ome:Pixels", ns) if ns else root.find(".//Pixels")
+                root = ET.fromstring(ome_xml)
+
+                # {*} matches any OME schema namespace (or none) in one walk
+                pixels = root.find(".//{*}Pixels")
                 if pixels is not None:
-                    break
-
-            if pixels is not None:
-                phys_x = pixels.get("PhysicalSizeX")
-                phys_y = pixels.get("PhysicalSizeY")
-                unit_x = pixels.get("PhysicalSizeXUnit", "um")
-                if phys_x:
-                    meta['physical_size_x'] = phys_x
-                if phys_y:
-                    meta['physical_size_y'] = phys_y
-                meta['unit'] = unit_x
-                meta['size_x'] = pixels.get("SizeX")
-                meta['size_y'] = pixels.get("SizeY")
-                meta['dtype_ome'] = pixels.get("Type")
-
-            # Try to get objective info
-            for ns in [
-                {{"ome": "http://www.openmicroscopy.org/Schemas/OME/2016-06"}},
-                {{"ome": "http://www.openmicroscopy.org/Schemas/OME/2015-01"}},
-                {{}},
-            ]:
-                objective = root.find(".//ome:Objective", ns) if ns else root.find(".//Objective")
+                    phys_x = pixels.get("PhysicalSizeX")
+                    phys_y = pixels.get("PhysicalSizeY")
+                    unit_x = pixels.get("PhysicalSizeXUnit", "um")
+                    if phys_x:
+                        meta['physical_size_x'] = phys_x
+                    if phys_y:
+                        meta['physical_size_y'] = phys_y
+                    meta['unit'] = unit_x
+                    meta['size_x'] = pixels.get("SizeX")
+                    meta['size_y'] = pixels.get("SizeY")
+                    meta['dtype_ome'] = pixels.get("Type")
+
+                # Try to get objective info
+                objective = root.find(".//{*}Objective")
                 if objective is not None:
                     meta['objective'] = objective.get("Model")
                     meta['magnification'] = objective.get("NominalMagnification")
-                    break
-
-            # Get channel info
-            for ns in [
-                {{"ome": "http://www.openmicroscopy.org/Schemas/OME/2016-06"}},
-                {{"ome": "http://www.openmicroscopy.org/Schemas/OME/2015-01"}},
-                {{}},
-            ]:
-                channels = root.findall(".//ome:Channel", ns) if ns else root.findall(".//Channel")
+
+                # Get channel info
+                channels = root.findall(".//{*}Channel")
                 if channels:
                     meta['channels'] = [c.get("Name", "Unknown") for c in channels]
-                    break
 
-        except ET.ParseError:
-            pass
-    else:
-        meta['has_ome'] = False
+            except ET.ParseError:
+                pass
+        else:
+            meta['has_ome'] = False
+
+        meta['shape'] = list(page.shape)
+        meta['dtype'] = str(page.dtype)
+        return meta
+
+
+def try_tifffile(file_path: Path) -> dict | None:
+    """Try to read metadata using tifffile, including parsing OME-XML."""
+    try:
+        if tifffile is not None:
+            # In-process: no interpreter start or tifffile import per file
+            return read_tiff_metadata(file_path)
 
-    meta['shape'] = list(page.shape)
-    meta['dtype'] = str(page.dtype)
-    print(json.dumps(meta))
+        # Use uv run to access tifffile in the virtual environment
+        result = subprocess.run(
+            ["uv", "run", "python", "-c", f"""
+import json
+import sys
+sys.path.insert(0, {str(Path(__file__).resolve().parent)!r})
+from verify_metadata import read_tiff_metadata
+print(json.dumps(read_tiff_metadata({str(file_path)!r})))
 """],
             capture_output=True,
             text=True,
             timeout=30
         )
         if result.returncode == 0:
-            import json
             return json.loads(result.stdout.strip())
     except Exception as e:
         print(f"tifffile error: {e}")
@@ -363,10 +360,9 @@ def main():
     if args.path.is_file():
         files = [args.path]
     elif args.path.is_dir():
-        files = list(args.path.glob("*.ome.tiff")) + list(args.path.glob("*.ome.tif"))
-        files.extend(args.path.glob("*.tiff"))
-        files.extend(args.path.glob("*.tif"))
-        files = sorted(set(files))
+        # *.ome.tif(f) is a subset of *.tif(f), so one pass covers both
+        files = sorted(Path(e.path) for e in scan_files(args.path, recursive=False)
+                       if e.name.lower().endswith((".tif", ".tiff")))
     else:
         print(f"Error: {args.path} not found")
         sys.exit(1)
@@ -17,23 +17,28 @@ import tempfile
 import shutil
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cellprofiler_tools.common import available_cpus, scan_files
 
 
 def find_files(root_dir: Path) -> tuple[list[Path], list[Path]]:
-    """Find all VSI and BTF files."""
+    """Find all VSI and BTF files (single walk, case-insensitive)."""
     vsi_files = []
     btf_files = []
 
-    for pattern in ["**/*.vsi", "**/*.VSI"]:
-        vsi_files.extend(root_dir.glob(pattern))
-
-    for pattern in ["**/*.btf", "**/*.BTF", "**/*.ome.btf"]:
-        btf_files.extend(root_dir.glob(pattern))
+    for entry in scan_files(root_dir):
+        name = entry.name.lower()
+        if name.endswith(".vsi"):
+            vsi_files.append(Path(entry.path))
+        elif name.endswith(".btf"):
+            btf_files.append(Path(entry.path))
 
-    return sorted(set(vsi_files)), sorted(set(btf_files))
+    return sorted(vsi_files), sorted(btf_files)
 
 
-def process_btf(btf_path: Path, output_dir: Path, verbose: bool = False) -> tuple[bool, str]:
+def process_btf(btf_path: Path, output_dir: Path, verbose: bool = False,
+                threads: int | None = None) -> tuple[bool, str]:
     """Process a BTF file - extract green channel."""
     cmd = [
         "uv", "run", "python", "btf_to_green.py",
@@ -41,6 +46,8 @@ def process_btf(btf_path: Path, output_dir: Path, verbose: bool = False) -> tupl
         str(output_dir),
         "--channel", "1",  # Green
     ]
+    if threads:
+        cmd.extend(["--threads", str(threads)])
     if verbose:
         cmd.append("-v")
 
@@ -56,18 +63,22 @@ def process_btf(btf_path: Path, output_dir: Path, verbose: bool = False) -> tupl
         return False, str(e)
 
 
-def process_vsi(vsi_path: Path, output_dir: Path, bfconvert: Path, temp_dir: Path, verbose: bool = False) -> tuple[bool, str]:
+def process_vsi(vsi_path: Path, output_dir: Path, bfconvert: Path, temp_dir: Path, verbose: bool = False,
+                temp_compression: str = "Uncompressed", threads: int | None = None) -> tuple[bool, str]:
     """Process a VSI file - convert to OME-TIFF then extract green channel."""
 
-    # Step 1: Convert VSI to OME-TIFF using bfconvert
-    temp_tiff = temp_dir / (vsi_path.stem + ".ome.tiff")
+    # Step 1: Convert VSI to OME-TIFF using bfconvert. Each job gets its own
+    # directory, since concurrent VSIs from different folders can share a stem
+    job_dir = Path(tempfile.mkdtemp(dir=temp_dir))
+    temp_tiff = job_dir / (vsi_path.stem + ".ome.tiff")
 
     cmd_convert = [
         str(bfconvert),
         "-bigtiff",
-        "-compression", "LZW",
-        "-tilex", "512",
-        "-tiley", "512",
+        # Read once and deleted: uncompressed skips an LZW encode and decode
+        "-compression", temp_compression,
+        "-tilex", "1024",
+        "-tiley", "1024",
         "-series", "0",  # Full resolution only
         str(vsi_path),
         str(temp_tiff)
@@ -91,28 +102,25 @@ def process_vsi(vsi_path: Path, output_dir: Path, bfconvert: Path, temp_dir: Pat
             str(output_dir),
             "--channel", "1",
         ]
+        if threads:
+            cmd_green.extend(["--threads", str(threads)])
         if verbose:
             cmd_green.append("-v")
 
         result = subprocess.run(cmd_green, capture_output=True, text=True, timeout=3600)
 
-        # Clean up temp file
-        if temp_tiff.exists():
-            temp_tiff.unlink()
-
         if result.returncode == 0:
             return True, "Converted and green channel extracted"
         else:
             return False, result.stderr[-500:] if result.stderr else "Green extraction failed"
 
     except subprocess.TimeoutExpired:
-        if temp_tiff.exists():
-            temp_tiff.unlink()
         return False, "Timeout"
     except Exception as e:
-        if temp_tiff.exists():
-            temp_tiff.unlink()
         return False, str(e)
+    finally:
+        # Clean up temp file
+        shutil.rmtree(job_dir, ignore_errors=True)
 
 
 def main():
@@ -122,16 +130,22 @@ def main():
     parser.add_argument("--bfconvert", type=Path, default=Path.home() / "bin/bftools/bftools/bfconvert",
                         help="Path to bfconvert")
     parser.add_argument("--temp-dir", type=Path, default=None, help="Temp directory for intermediate files")
+    parser.add_argument("--temp-compression", choices=["Uncompressed", "LZW", "zlib"], default="Uncompressed",
+                        help="bfconvert compression for intermediate files (default: Uncompressed; LZW saves temp space)")
     parser.add_argument("--btf-only", action="store_true", help="Only process BTF files")
     parser.add_argument("--vsi-only", action="store_true", help="Only process VSI files")
     parser.add_argument("--dry-run", "-n", action="store_true", help="Show what would be done")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose output")
     parser.add_argument("--skip-existing", action="store_true", help="Skip files that already have output")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="BTF files to process in parallel (default: half the CPUs)")
+    parser.add_argument("--vsi-jobs", type=int, default=1,
+                        help="VSI files to convert in parallel (default: 1; each bfconvert runs its own JVM)")
 
     args = parser.parse_args()
 
     # Validate inputs
-    if not args.input_dir.exists():
+    if not args.input_dir.is_dir():
         print(f"Error: Input directory not found: {args.input_dir}")
         sys.exit(1)
 
@@ -186,55 +200,90 @@ def main():
     if btf_files:
         print(f"\n--- Processing {len(btf_files)} BTF files ---\n")
 
-        for btf_file in btf_files:
-            current += 1
-
-            # Check if output exists
-            output_name = f"{btf_file.stem.replace('.ome', '')}_green.ome.tiff"
-            output_path = args.output_dir / output_name
-
-            if args.skip_existing and output_path.exists():
-                skipped += 1
-                print(f"[{current}/{total_files}] SKIP {btf_file.name} (output exists)")
-                continue
-
-            print(f"[{current}/{total_files}] {btf_file.name}")
-
-            success, msg = process_btf(btf_file, args.output_dir, args.verbose)
-
-            if success:
-                successful += 1
-                print(f"  ✓ {msg}")
-            else:
-                failed += 1
-                print(f"  ✗ {msg}")
+        # Each file streams tile by tile, so files are independent and small
+        # in memory; split the CPUs between files and compression threads.
+        # Each job is a btf_to_green subprocess, so threads are enough to
+        # wait on them
+        cpus = available_cpus()
+        jobs = args.jobs or max(1, min(cpus // 2, len(btf_files)))
+        threads = max(1, cpus // jobs)
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {}
+            for btf_file in btf_files:
+                # Check if output exists
+                output_name = f"{btf_file.stem.replace('.ome', '')}_green.ome.tiff"
+                output_path = args.output_dir / output_name
+
+                if args.skip_existing and output_path.exists():
+                    current += 1
+                    skipped += 1
+                    print(f"[{current}/{total_files}] SKIP {btf_file.name} (output exists)")
+                    continue
+
+                future = executor.submit(process_btf, btf_file, args.output_dir, args.verbose, threads)
+                futures[future] = btf_file
+
+            for future in as_completed(futures):
+                current += 1
+                success, msg = future.result()
+                print(f"[{current}/{total_files}] {futures[future].name}")
+
+                if success:
+                    successful += 1
+                    print(f"  ✓ {msg}")
+                else:
+                    failed += 1
+                    print(f"  ✗ {msg}")
 
     # Process VSI files
     if vsi_files:
         print(f"\n--- Processing {len(vsi_files)} VSI files ---\n")
 
-        for vsi_file in vsi_files:
-            current += 1
-
-            # Check if output exists
-            output_name = f"{vsi_file.stem}_green.ome.tiff"
-            output_path = args.output_dir / output_name
-
-            if args.skip_existing and output_path.exists():
-                skipped += 1
-                print(f"[{current}/{total_files}] SKIP {vsi_file.name} (output exists)")
-                continue
-
-            print(f"[{current}/{total_files}] {vsi_file.name}")
-
-            success, msg = process_vsi(vsi_file, args.output_dir, args.bfconvert, temp_dir, args.verbose)
-
-            if success:
-                successful += 1
-                print(f"  ✓ {msg}")
-            else:
-                failed += 1
-                print(f"  ✗ {msg}")
+        # Each VSI is two subprocesses (bfconvert, then btf_to_green), so
+        # threads are enough to run several at once
+        vsi_jobs = max(1, args.vsi_jobs)
+        threads = max(1, available_cpus() // vsi_jobs) if vsi_jobs > 1 else None
+
+        with ThreadPoolExecutor(max_workers=vsi_jobs) as executor:
+            futures = {}
+            claimed = {}
+            for vsi_file in vsi_files:
+                # Check if output exists
+                output_name = f"{vsi_file.stem}_green.ome.tiff"
+                output_path = args.output_dir / output_name
+
+                # Same stem in another subdirectory: both jobs would write
+                # this output at once
+                if output_name in claimed:
+                    current += 1
+                    failed += 1
+                    print(f"[{current}/{total_files}] {vsi_file.name}")
+                    print(f"  ✗ Output {output_name} already claimed by {claimed[output_name]}")
+                    continue
+                claimed[output_name] = vsi_file
+
+                if args.skip_existing and output_path.exists():
+                    current += 1
+                    skipped += 1
+                    print(f"[{current}/{total_files}] SKIP {vsi_file.name} (output exists)")
+                    continue
+
+                future = executor.submit(process_vsi, vsi_file, args.output_dir, args.bfconvert, temp_dir,
+                                         args.verbose, args.temp_compression, threads)
+                futures[future] = vsi_file
+
+            for future in as_completed(futures):
+                current += 1
+                success, msg = future.result()
+                print(f"[{current}/{total_files}] {futures[future].name}")
+
+                if success:
+                    successful += 1
+                    print(f"  ✓ {msg}")
+                else:
+                    failed += 1
+                    print(f"  ✗ {msg}")
 
     # Cleanup temp directory
     if not args.temp_dir and temp_dir.exists():
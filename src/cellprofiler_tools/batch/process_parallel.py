@@ -16,9 +16,10 @@ from pathlib import Path
 from datetime import datetime
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import Optional
 import multiprocessing as mp
 
+from cellprofiler_tools.common import scan_files
+
 
 @dataclass
 class ProcessResult:
@@ -30,21 +31,31 @@ class ProcessResult:
 
 def get_available_ram_gb() -> float:
     """Get available RAM in GB."""
+    # MemAvailable counts reclaimable page cache; free pages alone undercount
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / (1024**2)
+    except OSError:
+        pass
+    # No /proc (e.g. macOS)
     return psutil.virtual_memory().available / (1024**3)
 
 
 def find_files(root_dir: Path) -> tuple[list[Path], list[Path]]:
-    """Find all VSI and BTF files."""
+    """Find all VSI and BTF files (single walk, case-insensitive)."""
     vsi_files = []
     btf_files = []
 
-    for pattern in ["**/*.vsi", "**/*.VSI"]:
-        vsi_files.extend(root_dir.glob(pattern))
-
-    for pattern in ["**/*.btf", "**/*.BTF", "**/*.ome.btf"]:
-        btf_files.extend(root_dir.glob(pattern))
+    for entry in scan_files(root_dir):
+        name = entry.name.lower()
+        if name.endswith(".vsi"):
+            vsi_files.append(Path(entry.path))
+        elif name.endswith(".btf"):
+            btf_files.append(Path(entry.path))
 
-    return sorted(set(vsi_files)), sorted(set(btf_files))
+    return sorted(vsi_files), sorted(btf_files)
 
 
 def process_btf(btf_path: Path, output_dir: Path) -> ProcessResult:
@@ -66,9 +77,15 @@ def process_btf(btf_path: Path, output_dir: Path) -> ProcessResult:
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=3600)
         duration = time.time() - start
 
-        # Check if output file was created (more reliable than return code)
-        if output_path.exists() and output_path.stat().st_size > 1000:
-            size_mb = output_path.stat().st_size / (1024**2)
+        # Check if output file was created (more reliable than return code);
+        # a single stat() serves both the existence and the size check
+        try:
+            output_size = output_path.stat().st_size
+        except FileNotFoundError:
+            output_size = 0
+
+        if output_size > 1000:
+            size_mb = output_size / (1024**2)
             return ProcessResult(btf_path, True, f"OK ({size_mb:.0f}MB)", duration)
         elif result.returncode == 0:
             return ProcessResult(btf_path, True, "OK", duration)
@@ -81,7 +98,8 @@ def process_btf(btf_path: Path, output_dir: Path) -> ProcessResult:
         return ProcessResult(btf_path, False, str(e), time.time() - start)
 
 
-def process_vsi(vsi_path: Path, output_dir: Path, bfconvert: Path, temp_dir: Path) -> ProcessResult:
+def process_vsi(vsi_path: Path, output_dir: Path, bfconvert: Path, temp_dir: Path,
+                temp_compression: str = "Uncompressed") -> ProcessResult:
     """Process a VSI file - convert to OME-TIFF then extract green channel."""
     start = time.time()
 
@@ -91,9 +109,10 @@ def process_vsi(vsi_path: Path, output_dir: Path, bfconvert: Path, temp_dir: Pat
     cmd_convert = [
         str(bfconvert),
         "-bigtiff",
-        "-compression", "LZW",
-        "-tilex", "512",
-        "-tiley", "512",
+        # Read once and deleted: uncompressed skips an LZW encode and decode
+        "-compression", temp_compression,
+        "-tilex", "1024",
+        "-tiley", "1024",
         "-series", "0",
         str(vsi_path),
         str(temp_tiff)
@@ -141,8 +160,8 @@ def worker_btf(args):
 
 def worker_vsi(args):
     """Worker function for VSI processing."""
-    vsi_path, output_dir, bfconvert, temp_dir = args
-    return process_vsi(vsi_path, output_dir, bfconvert, temp_dir)
+    vsi_path, output_dir, bfconvert, temp_dir, temp_compression = args
+    return process_vsi(vsi_path, output_dir, bfconvert, temp_dir, temp_compression)
 
 
 def main():
@@ -151,6 +170,8 @@ def main():
     parser.add_argument("output_dir", type=Path, help="Output directory")
     parser.add_argument("--bfconvert", type=Path, default=Path.home() / "bin/bftools/bftools/bfconvert")
     parser.add_argument("--temp-dir", type=Path, default=None)
+    parser.add_argument("--temp-compression", choices=["Uncompressed", "LZW", "zlib"], default="Uncompressed",
+                        help="bfconvert compression for intermediate files (default: Uncompressed; LZW saves temp space)")
     parser.add_argument("--workers", "-j", type=int, default=4, help="Number of parallel workers (default: 4)")
     parser.add_argument("--max-workers", type=int, default=8, help="Max workers when RAM is plentiful (default: 8)")
     parser.add_argument("--min-ram-gb", type=float, default=16.0, help="Minimum free RAM in GB before throttling (default: 16)")
@@ -161,10 +182,16 @@ def main():
 
     args = parser.parse_args()
 
-    if not args.input_dir.exists():
+    if not args.input_dir.is_dir():
         print(f"Error: Input directory not found: {args.input_dir}")
         sys.exit(1)
 
+    # Check before the BTF pass, not after it when the first VSI fails
+    if not args.bfconvert.exists() and not args.btf_only:
+        print(f"Error: bfconvert not found at {args.bfconvert}")
+        print("Install Bio-Formats tools or use --btf-only")
+        sys.exit(1)
+
     vsi_files, btf_files = find_files(args.input_dir)
 
     if args.btf_only:
@@ -174,7 +201,6 @@ def main():
 
     # Filter out existing outputs
     if args.skip_existing:
-        args.output_dir.mkdir(parents=True, exist_ok=True)
         existing = {f.stem.replace("_green.ome", "").replace("_green", "") for f in args.output_dir.glob("*.tiff")}
 
         btf_files = [f for f in btf_files if f.stem.replace(".ome", "").replace("_raw", "") not in existing]
@@ -235,7 +261,7 @@ def main():
     if vsi_files:
         print(f"\n--- Processing {len(vsi_files)} VSI files with {args.workers} workers ---\n")
 
-        vsi_args = [(f, args.output_dir, args.bfconvert, temp_dir) for f in vsi_files]
+        vsi_args = [(f, args.output_dir, args.bfconvert, temp_dir, args.temp_compression) for f in vsi_files]
 
         with ProcessPoolExecutor(max_workers=args.workers) as executor:
             futures = {executor.submit(worker_vsi, arg): arg[0] for arg in vsi_args}
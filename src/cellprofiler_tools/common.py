@@ -0,0 +1,32 @@
+"""
+Helpers shared by the converter and batch scripts.
+"""
+
+import os
+from pathlib import Path
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (its affinity mask, e.g. a Slurm allocation)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def scan_files(root_dir: Path, recursive: bool = True):
+    """
+    Yield a DirEntry for each regular file under root_dir.
+
+    os.scandir reports the entry type from the directory listing itself, so
+    unlike Path.rglob plus is_file() there is no stat call per entry.
+    Symlinked directories are not followed.
+    """
+    dirs = [root_dir]
+    while dirs:
+        with os.scandir(dirs.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        dirs.append(entry.path)
+                elif entry.is_file():
+                    yield entry
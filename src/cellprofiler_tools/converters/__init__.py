@@ -5,4 +5,5 @@ Modules:
 - btf_to_green: Extract green channel from BigTIFF images
 - extract_channel: Generic channel extraction from RGB TIFF
 - vsi_to_ometiff: Convert Olympus VSI files to OME-TIFF
+- tiff_io: Tile sizing, page cache hints and read-ahead shared by the converters
 """
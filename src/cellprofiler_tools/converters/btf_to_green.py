@@ -3,9 +3,9 @@
 Extract green channel from large BigTIFF files with compression.
 
 This script processes large OME-BigTIFF files by:
-1. Reading the image (can handle multi-GB files with sufficient RAM)
+1. Streaming the image tile by tile (handles files larger than RAM)
 2. Extracting the green channel
-3. Writing with LZW/deflate compression
+3. Writing with zstd/deflate/LZW compression
 4. Preserving OME-XML metadata
 
 Typical size reduction: 8GB uncompressed RGB -> 500MB-1GB compressed green
@@ -22,17 +22,70 @@ Usage:
 """
 
 import argparse
-import gc
-import os
+import string
 import sys
+import threading
 import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import imagecodecs
 import numpy as np
 import tifffile
-import zarr
 from tqdm import tqdm
 
+from cellprofiler_tools.common import available_cpus, scan_files
+from cellprofiler_tools.converters.tiff_io import (
+    DEFAULT_TILE_SIZE,
+    PREFETCH_DEPTH,
+    advise_sequential,
+    drop_input_cache,
+    iter_prefetched,
+    prefetch,
+    resolve_tile_size,
+)
+
+# Matches Pixels in any OME schema namespace (or none) in a single walk
+PIXELS_PATH = ".//{*}Pixels"
+
+# Fast levels with a good ratio on microscopy data; zstd 1-5 favours speed,
+# 10-15 is balanced and 19-22 is archival
+DEFAULT_COMPRESSION_LEVELS = {"zstd": 3, "deflate": 4, "zlib": 4}
+
+# Tile encoders matching tifffile's codecs for each --compression choice
+TILE_ENCODERS = {
+    "zstd": imagecodecs.zstd_encode,
+    "deflate": imagecodecs.deflate_encode,
+    "zlib": imagecodecs.deflate_encode,
+    "lzw": imagecodecs.lzw_encode,
+}
+
+# Encode thread pools by worker count, and each encode thread's predictor
+# buffers; both live for the whole process so they are reused across files
+encode_pools = {}
+tile_buffers = threading.local()
+
+# Row band buffers of the current band shape, reused across bands and files
+band_buffers = {}
+
+# Tiles each encode worker may have in flight
+ENCODE_TILES_PER_WORKER = 2
+
+# Minimal OME-XML for single-channel grayscale output, filled per file
+OME_XML_TEMPLATE = string.Template('''<?xml version="1.0" encoding="UTF-8"?>
+<OME xmlns="http://www.openmicroscopy.org/Schemas/OME/2016-06">
+  <Image ID="Image:0" Name="green_channel">
+    <Pixels DimensionOrder="XYC" ID="Pixels:0"
+            PhysicalSizeX="$phys_x" PhysicalSizeXUnit="$unit"
+            PhysicalSizeY="$phys_y" PhysicalSizeYUnit="$unit"
+            SizeX="$width" SizeY="$height" SizeC="1" SizeZ="1" SizeT="1"
+            Type="$dtype">
+      <Channel ID="Channel:0:0" Name="Green" SamplesPerPixel="1"/>
+    </Pixels>
+  </Image>
+</OME>''')
+
 
 def extract_pixel_metadata(ome_xml: str) -> dict:
     """Extract pixel size and other metadata from OME-XML."""
@@ -46,16 +99,7 @@ def extract_pixel_metadata(ome_xml: str) -> dict:
             ome_xml = ome_xml[xml_start:]
 
         root = ET.fromstring(ome_xml)
-
-        # Try different namespace patterns
-        for ns_prefix in [
-            {"ome": "http://www.openmicroscopy.org/Schemas/OME/2015-01"},
-            {"ome": "http://www.openmicroscopy.org/Schemas/OME/2016-06"},
-            {},
-        ]:
-            pixels = root.find(".//ome:Pixels", ns_prefix) if ns_prefix else root.find(".//Pixels")
-            if pixels is not None:
-                break
+        pixels = root.find(PIXELS_PATH)
 
         if pixels is not None:
             phys_x = pixels.get("PhysicalSizeX")
@@ -87,6 +131,19 @@ def extract_pixel_metadata(ome_xml: str) -> dict:
     return metadata
 
 
+def get_compressionargs(compression: str, level: int | None = None) -> dict | None:
+    """
+    Build tifffile compressionargs for the given codec.
+
+    Deflate/zlib are encoded by libdeflate via imagecodecs, which supports
+    levels 1-12; zstd supports 1-22. LZW takes no level argument. If level
+    is None the codec's entry in DEFAULT_COMPRESSION_LEVELS is used.
+    """
+    if compression in DEFAULT_COMPRESSION_LEVELS:
+        return {"level": level or DEFAULT_COMPRESSION_LEVELS[compression]}
+    return None
+
+
 def create_ome_xml(metadata: dict, width: int, height: int) -> str:
     """Create minimal OME-XML for single-channel grayscale output."""
     phys_x = metadata.get("PhysicalSizeX", "")
@@ -98,37 +155,341 @@ def create_ome_xml(metadata: dict, width: int, height: int) -> str:
 
     dtype = metadata.get("Type", "uint8")
 
-    ome_xml = f'''<?xml version="1.0" encoding="UTF-8"?>
-<OME xmlns="http://www.openmicroscopy.org/Schemas/OME/2016-06">
-  <Image ID="Image:0" Name="green_channel">
-    <Pixels DimensionOrder="XYC" ID="Pixels:0"
-            PhysicalSizeX="{phys_x}" PhysicalSizeXUnit="{unit}"
-            PhysicalSizeY="{phys_y}" PhysicalSizeYUnit="{unit}"
-            SizeX="{width}" SizeY="{height}" SizeC="1" SizeZ="1" SizeT="1"
-            Type="{dtype}">
-      <Channel ID="Channel:0:0" Name="Green" SamplesPerPixel="1"/>
-    </Pixels>
-  </Image>
-</OME>'''
-    return ome_xml
+    return OME_XML_TEMPLATE.substitute(
+        phys_x=phys_x, phys_y=phys_y, unit=unit, width=width, height=height, dtype=dtype
+    )
+
+
+def open_image_array(tif: tifffile.TiffFile):
+    """
+    Open the first image of a TIFF for sliced reads without loading it.
+
+    Uncompressed, contiguous images are memory-mapped read-only, so slices
+    are served straight from the page cache. Other images go through a zarr
+    store that decodes tiles on demand. Both work on the page directly, so
+    tifffile never builds series (which re-parses the OME-XML).
+
+    Planar images (one plane per channel) are presented as (H, W, C) like
+    interleaved ones, so slicing one channel reads only that plane.
+
+    Returns (store, array) tuple; store is None for memory-mapped images and
+    array is None if no image data could be found. The caller is responsible
+    for closing the store.
+    """
+    page = tif.pages[0]
+    planar = page.planarconfig == tifffile.PLANARCONFIG.SEPARATE
+    if page.is_memmappable:
+        image = page.asarray(out='memmap')
+        advise_sequential(tif, image)
+        return None, (np.moveaxis(image, 0, -1) if planar else image)
+
+    # zarr takes ~0.3 s to import; memory-mapped inputs never need it
+    import zarr
+
+    advise_sequential(tif)
+    store = page.aszarr()
+    z = zarr.open(store, mode='r')
+
+    # Handle zarr array structure - may be nested for OME-TIFF
+    if hasattr(z, 'shape'):
+        image = z
+    elif '0' in z:
+        image = z['0']
+    else:
+        keys = list(z.keys())
+        image = z[keys[0]] if keys else None
+
+    if planar and image is not None:
+        image = PlanarView(image)
+    return store, image
+
+
+class PlanarView:
+    """
+    Index a planar (C, H, W) zarr array as (H, W, C).
+
+    Only the (rows, columns, channel) slicing used by the tile readers is
+    supported; zarr then decodes only the selected channel's segments.
+    """
+
+    def __init__(self, array):
+        self.array = array
+        self.shape = array.shape[1:] + array.shape[:1]
+        self.chunks = array.chunks[1:] + array.chunks[:1]
+
+    def __getitem__(self, key):
+        rows, cols, channel = key
+        return self.array[channel, rows, cols]
+
+
+def iter_channel_tiles(image, channel: int, tile_size: int):
+    """Yield single-channel tiles in the row-major order TiffWriter expects."""
+    height, width = image.shape[0], image.shape[1]
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            yield image[y:y + tile_size, x:x + tile_size, channel]
+
+
+def iter_row_bands(image, channel: int, band_rows: int):
+    """Yield one channel of an (H, W, C) array in bands of band_rows rows."""
+    # Slicing a zarr-backed image decodes it, so only memmaps are prefetched
+    mapped = isinstance(image, np.ndarray)
+    for y in range(0, image.shape[0], band_rows):
+        # Memory-mapped input: fetch the next band while this one is encoded
+        if mapped:
+            prefetch(image[y + band_rows:y + 2 * band_rows, :, channel])
+        yield np.asarray(image[y:y + band_rows, :, channel])
+
+
+def iter_segment_bands(page: tifffile.TiffPage, channel: int, band_rows: int, tile_size: int,
+                       in_flight_tiles: int, maxworkers: int | None = None):
+    """
+    Yield one channel of an interleaved page in bands of band_rows rows.
+
+    Each compressed tile or strip is decoded once, in tifffile's decode
+    thread pool, and its channel copied into the band it falls in. Segments
+    arrive in row-major order and are no taller than a band, so a band is
+    complete once a segment starts below it; rows a segment contributes
+    past the band's end (at most one segment's height, so buffers hold
+    band_rows plus that) are carried into the next one. Every pixel is
+    written by exactly one segment, so recycled band buffers need no
+    clearing.
+
+    Tiles are views of their band, and up to in_flight_tiles of them may
+    still be queued or encoding after their band was yielded. Buffers are
+    recycled round-robin from a ring large enough that none of those bands
+    is refilled (see get_band_buffers).
+    """
+    height, width = page.imagelength, page.imagewidth
+    # A segment starting in the band's last row ends at most this far past it
+    segment_rows = min(page.chunks[0], height)
+    # Bands the in-flight tiles can span, plus the band being filled
+    tiles_per_band = (band_rows // tile_size) * -(-width // tile_size)
+    ring = get_band_buffers(
+        (band_rows + segment_rows, width), page.dtype, -(-in_flight_tiles // tiles_per_band) + 2
+    )
+
+    def select_channel(decoded):
+        segment, index, shape = decoded
+        # index is (sample, depth, y, x, contig sample); edge tiles are padded
+        y, x = index[2], index[3]
+        if segment is None:
+            # Empty segment: zero fill its area
+            return y, x, np.zeros((min(shape[1], height - y), min(shape[2], width - x)), page.dtype)
+        return y, x, segment[0, :height - y, :width - x, channel]
+
+    band_start = 0
+    band_index = 0
+    band = ring[0]
+    # Rows of the current buffer written so far
+    filled = 0
+    for y, x, part in page.segments(func=select_channel, maxworkers=maxworkers):
+        while y >= band_start + band_rows:
+            yield band[:band_rows]
+            band_index += 1
+            carried = max(filled - band_rows, 0)
+            if carried:
+                ring[band_index % len(ring)][:carried] = band[band_rows:filled]
+            band = ring[band_index % len(ring)]
+            band_start += band_rows
+            filled = carried
+        rows = slice(y - band_start, y - band_start + part.shape[0])
+        band[rows, x:x + part.shape[1]] = part
+        filled = max(filled, rows.stop)
+    # The last band may still hold carried rows past band_rows
+    for y in range(band_start, height, band_rows):
+        yield band[y - band_start:min(y - band_start + band_rows, height - band_start)]
+
+
+def get_band_buffers(shape: tuple, dtype, count: int) -> list[np.ndarray]:
+    """
+    Return a ring of count row band buffers of the given shape.
+
+    Refilling a warm buffer is much cheaper than faulting in a fresh
+    multi-hundred-MB one per band. Buffers are kept for the next file of
+    the same size; each file's tiles are all written before the next one
+    starts, so none is still referenced then.
+    """
+    key = (shape, np.dtype(dtype))
+    if key not in band_buffers:
+        # Drop buffers of a previous image size
+        band_buffers.clear()
+        band_buffers[key] = []
+    ring = band_buffers[key]
+    while len(ring) < count:
+        ring.append(np.empty(shape, dtype))
+    return ring[:count]
+
+
+def iter_band_tiles(bands, tile_size: int):
+    """Split single-channel row bands into tiles in TiffWriter's order."""
+    for band in bands:
+        yield from iter_channel_tiles(band[..., np.newaxis], 0, tile_size)
+
+
+def estimate_clip_range(image, channel: int, percentiles, sample_every: int = 32) -> tuple[float, float]:
+    """
+    Estimate intensity limits for 8-bit rescaling without a full scan.
+
+    Samples every sample_every-th row of a memory-mapped image, or one row
+    from every sample_every-th band of tiles of a zarr array so only a
+    fraction of the compressed tiles is decoded.
+    """
+    step = sample_every * (image.chunks[0] if hasattr(image, "chunks") else 1)
+    rows = [np.asarray(image[y, :, channel]) for y in range(0, image.shape[0], step)]
+    lo, hi = np.percentile(np.stack(rows), percentiles)
+    return float(lo), float(hi)
+
+
+def is_quantizable(dtype) -> bool:
+    """Whether --uint8 rescales this input: integer data wider than 8 bits."""
+    return np.issubdtype(dtype, np.integer) and np.dtype(dtype).itemsize > 1
+
+
+def quantize_tiles(tiles, lo: float, hi: float):
+    """
+    Linearly rescale tiles so [lo, hi] maps onto 0-255, as uint8.
+
+    The arithmetic runs in place in one float32 scratch tile reused across
+    tiles (edge tiles use a view of it), so each tile costs only its uint8
+    result instead of four full-size temporaries.
+    """
+    # A flat image (hi == lo) thresholds at lo rather than dividing by zero
+    scale = np.float32(255.0 / (hi - lo) if hi > lo else 255.0)
+    offset = np.float32(lo) * scale
+    scratch = None
+    for tile in tiles:
+        if scratch is None:
+            scratch = np.empty(tile.shape, dtype=np.float32)
+        scaled = scratch[:tile.shape[0], :tile.shape[1]]
+        np.multiply(tile, scale, out=scaled, dtype=np.float32)
+        np.subtract(scaled, offset, out=scaled)
+        np.clip(scaled, 0, 255, out=scaled)
+        quantized = np.empty(tile.shape, dtype=np.uint8)
+        np.copyto(quantized, scaled, casting='unsafe')
+        yield quantized
+
+
+def get_tile_buffer(tile_size: int, dtype) -> np.ndarray:
+    """
+    Return this thread's reusable tile buffer for (tile_size, dtype).
+
+    Encoders copy their input into the compressed bytes, so one buffer per
+    encode thread is enough. Reusing it avoids an allocation (and, for
+    multi-MB tiles, an mmap/munmap pair) per tile.
+    """
+    cache = getattr(tile_buffers, "cache", None)
+    if cache is None:
+        cache = tile_buffers.cache = {}
+    key = (tile_size, np.dtype(dtype))
+    if key not in cache:
+        cache[key] = np.empty((tile_size, tile_size), dtype=dtype)
+    return cache[key]
+
+
+def get_encode_pool(maxworkers: int) -> ThreadPoolExecutor:
+    """Return this process's tile encoding pool with the given worker count."""
+    if maxworkers not in encode_pools:
+        encode_pools[maxworkers] = ThreadPoolExecutor(maxworkers)
+    return encode_pools[maxworkers]
+
+
+def get_predictor(dtype) -> int | None:
+    """
+    Return the TIFF predictor encode_tile applies to tiles of dtype.
+
+    Integers up to 32 bits use horizontal differencing (2) and floats the
+    floating-point predictor (3); other types are written without one.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind in "iu" and dtype.itemsize <= 4:
+        return 2
+    if dtype.kind == "f":
+        return 3
+    return None
+
+
+def encode_tile(tile: np.ndarray, tile_size: int, encode, compressionargs: dict,
+                predictor: int | None = 2) -> bytes:
+    """
+    Apply the TIFF predictor (see get_predictor) to a tile and compress it.
+
+    For horizontal differencing, full tiles go through imagecodecs'
+    predictor, which gathers a strided channel view in the same pass, and
+    edge tiles are differenced straight into a zero-padded buffer instead
+    of padding first and differencing a copy. Integer subtraction wraps, as
+    TIFF predictor 2 requires. Other tiles are padded first, then encoded.
+    """
+    height, width = tile.shape
+    buffer = get_tile_buffer(tile_size, tile.dtype)
+    if predictor == 2:
+        if (height, width) == (tile_size, tile_size):
+            imagecodecs.delta_encode(tile, axis=-1, out=buffer)
+            return encode(buffer, **compressionargs)
+
+        buffer[height:] = 0
+        buffer[:height, width:] = 0
+        buffer[:height, 0] = tile[:, 0]
+        np.subtract(tile[:, 1:], tile[:, :-1], out=buffer[:height, 1:width])
+        return encode(buffer, **compressionargs)
+
+    buffer[:height, :width] = tile
+    buffer[height:] = 0
+    buffer[:height, width:] = 0
+    if predictor == 3:
+        return encode(imagecodecs.floatpred_encode(buffer, axis=-1), **compressionargs)
+    return encode(buffer, **compressionargs)
+
+
+def iter_encoded_tiles(
+    tiles,
+    tile_size: int,
+    compression: str,
+    compression_level: int | None = None,
+    maxworkers: int | None = None,
+    predictor: int | None = 2,
+):
+    """
+    Compress tiles in a thread pool, yielding the bytes in input order.
+
+    imagecodecs releases the GIL while encoding, so tiles compress on all
+    workers and tifffile only has to write the finished segments, skipping
+    its own per-tile padding and encoding loop. At most two tiles per worker
+    are in flight, so memory stays bounded.
+    """
+    encode = TILE_ENCODERS[compression]
+    compressionargs = get_compressionargs(compression, compression_level) or {}
+    maxworkers = maxworkers or available_cpus()
+
+    pool = get_encode_pool(maxworkers)
+    pending = deque()
+    for tile in tiles:
+        pending.append(pool.submit(encode_tile, tile, tile_size, encode, compressionargs, predictor))
+        if len(pending) >= ENCODE_TILES_PER_WORKER * maxworkers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
 
 
 def process_btf_file_chunked(
     input_path: Path,
     output_dir: Path,
-    compression: str = "deflate",
-    compression_level: int = 6,
-    tile_size: int = 512,
+    compression: str = "zstd",
+    compression_level: int | None = None,
+    tile_size: int | None = None,
+    maxworkers: int | None = None,
     channel: int = 1,
     dry_run: bool = False,
     verbose: bool = False,
     chunk_rows: int = 2048,
+    clip_percentiles: tuple[float, float] | None = None,
 ) -> tuple[bool, str]:
     """
     Extract green channel from a BigTIFF file with compression.
 
-    Uses memory-mapped temporary file to process the image in chunks
-    without loading the entire file into RAM at once.
+    Reads the image in bands of chunk_rows rows and streams each band's
+    tiles into the writer, so neither the input nor the extracted channel
+    is ever held in full, in RAM or in a temporary file.
 
     Returns (success, message) tuple.
     """
@@ -141,26 +502,38 @@ def process_btf_file_chunked(
     if dry_run:
         return True, f"Would process: {input_path.name} -> {output_name}"
 
-    temp_path = None
+    # Also sizes the band buffer ring, so resolve the encoder's default here
+    maxworkers = maxworkers or available_cpus()
+
     try:
         with tifffile.TiffFile(input_path) as tif:
             page = tif.pages[0]
             shape = page.shape
 
-            if len(shape) < 3 or shape[-1] not in [3, 4]:
+            # Interleaved (H, W, C) or planar (C, H, W) RGB(A)
+            if len(shape) < 3 or page.samplesperpixel not in [3, 4]:
                 return False, f"Not an RGB image (shape: {shape})"
 
-            height, width = shape[0], shape[1]
+            tile_size = resolve_tile_size(page, tile_size)
+
+            # Rescale to 8-bit only integer input with more bits to drop
+            quantize = clip_percentiles is not None and is_quantizable(page.dtype)
+            output_dtype = np.uint8 if quantize else page.dtype
+            # Must match the predictor encode_tile applies
+            predictor = get_predictor(output_dtype)
+
+            height, width = page.imagelength, page.imagewidth
             dtype = page.dtype
             input_size_gb = input_path.stat().st_size / (1024**3)
 
             if verbose:
-                print(f"  Input: {width}x{height}, {shape[-1]} channels, {input_size_gb:.1f} GB")
+                print(f"  Input: {width}x{height}, {page.samplesperpixel} channels, {input_size_gb:.1f} GB")
 
-            # Extract metadata
+            # Extract metadata (parsed once, reused for the output OME-XML)
             metadata = {}
-            if tif.ome_metadata:
-                metadata = extract_pixel_metadata(tif.ome_metadata)
+            ome_xml = tif.ome_metadata
+            if ome_xml:
+                metadata = extract_pixel_metadata(ome_xml)
                 if verbose and metadata.get("PhysicalSizeX"):
                     print(f"  Pixel size: {metadata['PhysicalSizeX']} {metadata.get('PhysicalSizeXUnit', 'µm')}")
 
@@ -168,9 +541,11 @@ def process_btf_file_chunked(
             output_dir.mkdir(parents=True, exist_ok=True)
 
             # Create OME-XML
+            if quantize:
+                metadata["Type"] = "uint8"
             ome_xml = create_ome_xml(metadata, width, height)
 
-            # Align chunk_rows to tile_size for efficient writing
+            # Align chunk_rows to tile_size so bands split into whole tiles
             chunk_rows = ((chunk_rows + tile_size - 1) // tile_size) * tile_size
 
             # Calculate number of chunks
@@ -180,65 +555,56 @@ def process_btf_file_chunked(
                 chunk_mem_mb = (chunk_rows * width * np.dtype(dtype).itemsize) / (1024**2)
                 print(f"  Processing in {num_chunks} chunks (~{chunk_mem_mb:.0f} MB each)")
 
-            # Use zarr store for memory-efficient access (reads tiles on demand)
-            store = tif.aszarr()
-            z = zarr.open(store, mode='r')
-
-            # Handle zarr array structure - may be nested for OME-TIFF
-            if hasattr(z, 'shape'):
-                zarray = z
-            elif '0' in z:
-                zarray = z['0']
-            else:
-                keys = list(z.keys())
-                if keys:
-                    zarray = z[keys[0]]
-                else:
-                    return False, "Could not access image data via zarr"
-
-            # Create memory-mapped temp file for the single-channel output
-            # Use output_dir for temp files to avoid filling /tmp (which may be RAM-based)
-            temp_path = output_dir / f".tmp_{input_path.stem}_{os.getpid()}.dat"
-            temp_file = None  # Will be created by memmap
-
-            # Create memory-mapped array
-            memmap_shape = (height, width)
-            memmap_array = np.memmap(temp_path, dtype=dtype, mode='w+', shape=memmap_shape)
+            # Memory-map uncompressed input, else read tiles on demand via zarr
+            store, image = open_image_array(tif)
+            if image is None:
+                store.close()
+                return False, "Could not access image data via zarr"
 
             if verbose:
-                print(f"  Extracting {channel_name} channel...")
-
-            # Fill the memmap chunk by chunk
-            for chunk_idx in tqdm(range(num_chunks), desc="  Reading", disable=not verbose):
-                row_start = chunk_idx * chunk_rows
-                row_end = min(row_start + chunk_rows, height)
+                print(f"  Streaming {channel_name} channel to compressed output...")
 
-                # Read chunk via zarr (only loads necessary tiles from disk)
-                memmap_array[row_start:row_end, :] = zarray[row_start:row_end, :, channel]
-
-            # Flush to disk
-            memmap_array.flush()
-
-            store.close()
-
-            if verbose:
-                print(f"  Writing compressed output...")
-
-            # Write the memmap to compressed TIFF
-            tifffile.imwrite(
-                output_path,
-                memmap_array,
-                bigtiff=True,
-                tile=(tile_size, tile_size),
-                compression=compression,
-                compressionargs={"level": compression_level},
-                photometric="minisblack",
-                description=ome_xml,
-            )
-
-            # Clean up memmap
-            del memmap_array
-            gc.collect()
+            try:
+                # Compressed interleaved tiles/strips no taller than a band are
+                # decoded once each in tifffile's thread pool. Planar images go
+                # through zarr instead, which skips the other channels' planes
+                planar = page.planarconfig == tifffile.PLANARCONFIG.SEPARATE
+                if not page.is_memmappable and not planar and page.chunks[0] <= chunk_rows:
+                    # Tiles that may still view a yielded band: the prefetch
+                    # queue, the reader's and consumer's current tiles, the
+                    # encoder's loop variable and its window of futures
+                    in_flight = PREFETCH_DEPTH + 3 + ENCODE_TILES_PER_WORKER * maxworkers
+                    bands = iter_segment_bands(page, channel, chunk_rows, tile_size, in_flight, maxworkers)
+                else:
+                    bands = iter_row_bands(image, channel, chunk_rows)
+                # No bar when logging to a file; it would only add redraws
+                bands = tqdm(bands, total=num_chunks, desc="  Processing", mininterval=1.0,
+                             disable=not verbose or not sys.stderr.isatty())
+
+                tiles = iter_band_tiles(bands, tile_size)
+                if quantize:
+                    lo, hi = estimate_clip_range(image, channel, clip_percentiles)
+                    if verbose:
+                        print(f"  Rescaling {lo:.0f}-{hi:.0f} to 8-bit")
+                    tiles = quantize_tiles(tiles, lo, hi)
+                tiles = iter_prefetched(tiles)
+                with tifffile.TiffWriter(output_path, bigtiff=True) as tw:
+                    tw.write(
+                        iter_encoded_tiles(tiles, tile_size, compression, compression_level, maxworkers, predictor),
+                        shape=(height, width),
+                        dtype=output_dtype,
+                        tile=(tile_size, tile_size),
+                        compression=compression,
+                        predictor=predictor,
+                        photometric="minisblack",
+                        description=ome_xml,
+                    )
+            finally:
+                if store is not None:
+                    store.close()
+                # Unmap the input so its cached pages can be dropped
+                del image
+                drop_input_cache(tif)
 
             output_size_mb = output_path.stat().st_size / (1024**2)
             reduction = input_size_gb * 1024 / output_size_mb
@@ -250,28 +616,25 @@ def process_btf_file_chunked(
     except Exception as e:
         import traceback
         return False, f"Error: {e}\n{traceback.format_exc()}"
-    finally:
-        # Clean up temp file
-        if temp_path is not None:
-            try:
-                os.unlink(temp_path)
-            except Exception:
-                pass
 
 
 def process_btf_file(
     input_path: Path,
     output_dir: Path,
-    compression: str = "deflate",
-    compression_level: int = 6,
-    tile_size: int = 512,
+    compression: str = "zstd",
+    compression_level: int | None = None,
+    tile_size: int | None = None,
+    maxworkers: int | None = None,
     channel: int = 1,
     dry_run: bool = False,
     verbose: bool = False,
+    clip_percentiles: tuple[float, float] | None = None,
 ) -> tuple[bool, str]:
     """
     Extract green channel from a BigTIFF file with compression.
-    Legacy function - loads entire image into memory.
+
+    Streams tiles from the input straight into the TIFF writer, so only
+    one tile is held in memory at a time (no temporary file needed).
 
     Returns (success, message) tuple.
     """
@@ -289,61 +652,74 @@ def process_btf_file(
             page = tif.pages[0]
             shape = page.shape
 
-            if len(shape) < 3 or shape[-1] not in [3, 4]:
+            # Interleaved (H, W, C) or planar (C, H, W) RGB(A)
+            if len(shape) < 3 or page.samplesperpixel not in [3, 4]:
                 return False, f"Not an RGB image (shape: {shape})"
 
-            height, width = shape[0], shape[1]
+            tile_size = resolve_tile_size(page, tile_size)
+
+            # Rescale to 8-bit only integer input with more bits to drop
+            quantize = clip_percentiles is not None and is_quantizable(page.dtype)
+            output_dtype = np.uint8 if quantize else page.dtype
+            # Must match the predictor encode_tile applies
+            predictor = get_predictor(output_dtype)
+
+            height, width = page.imagelength, page.imagewidth
             input_size_gb = input_path.stat().st_size / (1024**3)
 
             if verbose:
-                print(f"  Input: {width}x{height}, {shape[-1]} channels, {input_size_gb:.1f} GB")
+                print(f"  Input: {width}x{height}, {page.samplesperpixel} channels, {input_size_gb:.1f} GB")
 
-            # Extract metadata
+            # Extract metadata (parsed once, reused for the output OME-XML)
             metadata = {}
-            if tif.ome_metadata:
-                metadata = extract_pixel_metadata(tif.ome_metadata)
+            ome_xml = tif.ome_metadata
+            if ome_xml:
+                metadata = extract_pixel_metadata(ome_xml)
                 if verbose and metadata.get("PhysicalSizeX"):
                     print(f"  Pixel size: {metadata['PhysicalSizeX']} {metadata.get('PhysicalSizeXUnit', 'µm')}")
 
-            # Read full image - this requires sufficient RAM
-            if verbose:
-                print(f"  Reading image data...")
-
-            data = page.asarray()
-
-            # Extract channel
-            if verbose:
-                print(f"  Extracting {channel_name} channel...")
-
-            green_data = data[:, :, channel]
-
-            # Free RGB data
-            del data
-            gc.collect()
-
             # Create output directory
             output_dir.mkdir(parents=True, exist_ok=True)
 
             # Create OME-XML
+            if quantize:
+                metadata["Type"] = "uint8"
             ome_xml = create_ome_xml(metadata, width, height)
 
-            # Write with compression
+            store, image = open_image_array(tif)
+            if image is None:
+                store.close()
+                return False, "Could not access image data via zarr"
+
+            # Stream channel tiles through the compressor
             if verbose:
-                print(f"  Writing compressed output...")
-
-            tifffile.imwrite(
-                output_path,
-                green_data,
-                bigtiff=True,
-                tile=(tile_size, tile_size),
-                compression=compression,
-                compressionargs={"level": compression_level},
-                photometric="minisblack",
-                description=ome_xml,
-            )
-
-            del green_data
-            gc.collect()
+                print(f"  Streaming {channel_name} channel to compressed output...")
+
+            try:
+                tiles = iter_channel_tiles(image, channel, tile_size)
+                if quantize:
+                    lo, hi = estimate_clip_range(image, channel, clip_percentiles)
+                    if verbose:
+                        print(f"  Rescaling {lo:.0f}-{hi:.0f} to 8-bit")
+                    tiles = quantize_tiles(tiles, lo, hi)
+                tiles = iter_prefetched(tiles)
+                with tifffile.TiffWriter(output_path, bigtiff=True) as tw:
+                    tw.write(
+                        iter_encoded_tiles(tiles, tile_size, compression, compression_level, maxworkers, predictor),
+                        shape=(height, width),
+                        dtype=output_dtype,
+                        tile=(tile_size, tile_size),
+                        compression=compression,
+                        predictor=predictor,
+                        photometric="minisblack",
+                        description=ome_xml,
+                    )
+            finally:
+                if store is not None:
+                    store.close()
+                # Unmap the input so its cached pages can be dropped
+                del image
+                drop_input_cache(tif)
 
             output_size_mb = output_path.stat().st_size / (1024**2)
             reduction = input_size_gb * 1024 / output_size_mb
@@ -351,23 +727,122 @@ def process_btf_file(
             return True, f"Created {output_path.name} ({output_size_mb:.0f} MB, {reduction:.1f}x reduction)"
 
     except MemoryError:
-        return False, "Out of memory - file too large for available RAM"
+        return False, "Out of memory - try reducing --tile-size"
     except Exception as e:
         return False, f"Error: {e}"
 
 
-def find_btf_files(root_dir: Path, recursive: bool = True) -> list[Path]:
-    """Find all BigTIFF files in directory."""
-    patterns = ["*.btf", "*.ome.btf", "*.BTF"]
-    files = []
+def append_btf_series(
+    tw: tifffile.TiffWriter,
+    input_path: Path,
+    compression: str = "zstd",
+    compression_level: int | None = None,
+    tile_size: int | None = None,
+    maxworkers: int | None = None,
+    channel: int = 1,
+    verbose: bool = False,
+    clip_percentiles: tuple[float, float] | None = None,
+) -> tuple[bool, str]:
+    """
+    Append one channel of a BigTIFF file as a new series of an open OME writer.
 
-    for pattern in patterns:
-        if recursive:
-            files.extend(root_dir.glob(f"**/{pattern}"))
-        else:
-            files.extend(root_dir.glob(pattern))
+    tifffile builds the combined OME-XML from each series' metadata, so no
+    per-file OME-XML is constructed here. A failure while writing leaves a
+    partial series in tw, so callers should abandon the output file then.
+
+    Returns (success, message) tuple.
+    """
+    try:
+        with tifffile.TiffFile(input_path) as tif:
+            page = tif.pages[0]
+            shape = page.shape
+
+            # Interleaved (H, W, C) or planar (C, H, W) RGB(A)
+            if len(shape) < 3 or page.samplesperpixel not in [3, 4]:
+                return False, f"Not an RGB image (shape: {shape})"
 
-    return sorted(set(files))
+            tile_size = resolve_tile_size(page, tile_size)
+
+            # Rescale to 8-bit only integer input with more bits to drop
+            quantize = clip_percentiles is not None and is_quantizable(page.dtype)
+            output_dtype = np.uint8 if quantize else page.dtype
+            # Must match the predictor encode_tile applies
+            predictor = get_predictor(output_dtype)
+            height, width = page.imagelength, page.imagewidth
+
+            # Pixel sizes for this series' OME Pixels element
+            series_metadata = {"Name": input_path.stem.replace('.ome', '')}
+            ome_xml = tif.ome_metadata
+            if ome_xml:
+                pixel_metadata = extract_pixel_metadata(ome_xml)
+                for key in ("PhysicalSizeX", "PhysicalSizeXUnit", "PhysicalSizeY", "PhysicalSizeYUnit"):
+                    if pixel_metadata.get(key):
+                        series_metadata[key] = pixel_metadata[key]
+
+            if verbose:
+                print(f"  Appending {width}x{height} series from {input_path.name}...")
+
+            store, image = open_image_array(tif)
+            if image is None:
+                store.close()
+                return False, "Could not access image data via zarr"
+
+            try:
+                # One band per row of tiles: wide input strips are decoded once
+                tiles = iter_band_tiles(iter_row_bands(image, channel, tile_size), tile_size)
+                if quantize:
+                    lo, hi = estimate_clip_range(image, channel, clip_percentiles)
+                    if verbose:
+                        print(f"  Rescaling {lo:.0f}-{hi:.0f} to 8-bit")
+                    tiles = quantize_tiles(tiles, lo, hi)
+                tiles = iter_prefetched(tiles)
+                tw.write(
+                    iter_encoded_tiles(tiles, tile_size, compression, compression_level, maxworkers, predictor),
+                    shape=(height, width),
+                    dtype=output_dtype,
+                    tile=(tile_size, tile_size),
+                    compression=compression,
+                    predictor=predictor,
+                    photometric="minisblack",
+                    metadata=series_metadata,
+                )
+            finally:
+                if store is not None:
+                    store.close()
+                # Unmap the input so its cached pages can be dropped
+                del image
+                drop_input_cache(tif)
+
+            return True, f"Appended {width}x{height} series"
+
+    except MemoryError:
+        return False, "Out of memory - try reducing --tile-size"
+    except Exception as e:
+        return False, f"Error: {e}"
+
+
+def check_rgb_tiff(input_path: Path) -> tuple[bool, str]:
+    """
+    Cheaply check that a TIFF's first page is RGB(A).
+
+    Only the first page header is read: the OME-XML is never parsed and
+    multi-file OME references are not followed. Returns (is_rgb, message).
+    """
+    try:
+        with tifffile.TiffFile(input_path, _multifile=False) as tif:
+            shape = tif.pages[0].shape
+            samples = tif.pages[0].samplesperpixel
+    except Exception as e:
+        return False, f"Could not read TIFF header: {e}"
+
+    if len(shape) < 3 or samples not in [3, 4]:
+        return False, f"Not an RGB image (shape: {shape})"
+    return True, "RGB"
+
+
+def find_btf_files(root_dir: Path, recursive: bool = True) -> list[Path]:
+    """Find all BigTIFF files in directory (single walk, case-insensitive)."""
+    return sorted(Path(e.path) for e in scan_files(root_dir, recursive) if e.name.lower().endswith(".btf"))
 
 
 def main():
@@ -394,21 +869,35 @@ def main():
     )
     parser.add_argument(
         "--compression",
-        choices=["deflate", "lzw", "zlib", "zstd"],
-        default="deflate",
-        help="Compression type (default: deflate)"
+        choices=["zstd", "deflate", "lzw", "zlib"],
+        default="zstd",
+        help="Compression type (default: zstd)"
     )
     parser.add_argument(
         "--compression-level",
         type=int,
-        default=6,
-        help="Compression level 1-9 (default: 6)"
+        default=None,
+        help="Compression level: zstd 1-22 (default: 3; 1-5 fast, 10-15 balanced, "
+             "19-22 archival), deflate/zlib 1-12 (default: 4)"
     )
     parser.add_argument(
         "--tile-size",
         type=int,
-        default=512,
-        help="Tile size (default: 512)"
+        default=None,
+        help=f"Tile size, rounded up to a multiple of 16 "
+             f"(default: match input tiles, else {DEFAULT_TILE_SIZE})"
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=None,
+        help="Number of files to process in parallel (default: half the CPUs)"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Threads for parallel tile compression per file (default: CPUs / jobs)"
     )
     parser.add_argument(
         "--recursive", "-r",
@@ -434,10 +923,32 @@ def main():
     parser.add_argument(
         "--no-chunked",
         action="store_true",
-        help="Disable chunked processing (loads entire image into RAM)"
+        help="Read each output tile separately instead of in bands of --chunk-rows rows"
+    )
+    parser.add_argument(
+        "--uint8",
+        action="store_true",
+        help="Rescale 16-bit integer input to 8-bit between --clip-percentiles "
+             "(halves output, not bit-exact; float input is written unchanged)"
+    )
+    parser.add_argument(
+        "--clip-percentiles",
+        type=float,
+        nargs=2,
+        default=[0.1, 99.9],
+        metavar=("LO", "HI"),
+        help="Intensity percentiles mapped to 0 and 255 by --uint8 (default: 0.1 99.9)"
+    )
+    parser.add_argument(
+        "--single-output",
+        metavar="NAME",
+        default=None,
+        help="Write all inputs as series of one OME-TIFF named NAME in output_dir "
+             "(files are read one at a time, using all CPUs for compression)"
     )
 
     args = parser.parse_args()
+    clip_percentiles = tuple(args.clip_percentiles) if args.uint8 else None
 
     # Find input files
     if args.input_path.is_file():
@@ -459,42 +970,127 @@ def main():
         print("DRY RUN - no files will be created")
     print()
 
+    # Reject non-RGB inputs from their first page header alone, before any
+    # worker opens them in full
+    rejected = {}
+    for f in files:
+        is_rgb, msg = check_rgb_tiff(f)
+        if not is_rgb:
+            rejected[f] = msg
+            print(f"  ✗ {f.name}: {msg}")
+    if rejected:
+        files = [f for f in files if f not in rejected]
+        print(f"Skipping {len(rejected)} non-RGB file(s)")
+        print()
+
     successful = 0
-    failed = 0
-
-    for i, f in enumerate(files, 1):
-        print(f"[{i}/{len(files)}] {f.name}")
-
-        if args.no_chunked:
-            success, msg = process_btf_file(
-                f,
-                args.output_dir,
-                compression=args.compression,
-                compression_level=args.compression_level,
-                tile_size=args.tile_size,
-                channel=args.channel,
-                dry_run=args.dry_run,
-                verbose=args.verbose,
-            )
+    failed = len(rejected)
+    cpus = available_cpus()
+
+    if args.single_output:
+        # Inputs are appended one at a time as series of a single OME-TIFF,
+        # so every CPU goes to tile compression
+        output_path = args.output_dir / args.single_output
+        threads = args.threads or cpus
+        print(f"Writing {len(files)} series to {output_path}")
+        print()
+
+        if args.dry_run:
+            for i, f in enumerate(files, 1):
+                print(f"[{i}/{len(files)}] {f.name}")
+                print(f"  ✓ Would append as a series of {output_path.name}")
+            successful += len(files)
         else:
-            success, msg = process_btf_file_chunked(
-                f,
-                args.output_dir,
-                compression=args.compression,
-                compression_level=args.compression_level,
-                tile_size=args.tile_size,
-                channel=args.channel,
-                dry_run=args.dry_run,
-                verbose=args.verbose,
-                chunk_rows=args.chunk_rows,
-            )
-
-        if success:
-            successful += 1
-            print(f"  ✓ {msg}")
-        else:
-            failed += 1
-            print(f"  ✗ {msg}")
+            args.output_dir.mkdir(parents=True, exist_ok=True)
+            aborted = False
+            try:
+                with tifffile.TiffWriter(output_path, bigtiff=True, ome=True) as tw:
+                    for i, f in enumerate(files, 1):
+                        success, msg = append_btf_series(
+                            tw,
+                            f,
+                            compression=args.compression,
+                            compression_level=args.compression_level,
+                            tile_size=args.tile_size,
+                            maxworkers=threads,
+                            channel=args.channel,
+                            verbose=args.verbose,
+                            clip_percentiles=clip_percentiles,
+                        )
+                        print(f"[{i}/{len(files)}] {f.name}")
+
+                        if success:
+                            successful += 1
+                            print(f"  ✓ {msg}")
+                        else:
+                            print(f"  ✗ {msg}")
+                            # The failed series may be partly written and its
+                            # pages cannot be taken back out of the shared file
+                            aborted = True
+                            break
+            except Exception as e:
+                # Closing after a truncated series can fail as well
+                if not aborted:
+                    raise
+                print(f"  ✗ Error closing {output_path.name}: {e}")
+            if aborted:
+                output_path.unlink(missing_ok=True)
+                print(f"Aborted: removed {output_path}")
+                successful = 0
+                failed += len(files)
+    else:
+        # Split CPUs between concurrent files and per-file compression threads
+        jobs = args.jobs or max(1, min(cpus // 2, len(files)))
+        threads = args.threads or max(1, cpus // jobs)
+        if jobs > 1:
+            print(f"Processing {jobs} files in parallel ({threads} threads each)")
+            print()
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {}
+            for f in files:
+                if args.no_chunked:
+                    future = executor.submit(
+                        process_btf_file,
+                        f,
+                        args.output_dir,
+                        compression=args.compression,
+                        compression_level=args.compression_level,
+                        tile_size=args.tile_size,
+                        maxworkers=threads,
+                        channel=args.channel,
+                        dry_run=args.dry_run,
+                        verbose=args.verbose,
+                        clip_percentiles=clip_percentiles,
+                    )
+                else:
+                    future = executor.submit(
+                        process_btf_file_chunked,
+                        f,
+                        args.output_dir,
+                        compression=args.compression,
+                        compression_level=args.compression_level,
+                        tile_size=args.tile_size,
+                        maxworkers=threads,
+                        channel=args.channel,
+                        dry_run=args.dry_run,
+                        verbose=args.verbose,
+                        chunk_rows=args.chunk_rows,
+                        clip_percentiles=clip_percentiles,
+                    )
+                futures[future] = f
+
+            for i, future in enumerate(as_completed(futures), 1):
+                f = futures[future]
+                success, msg = future.result()
+                print(f"[{i}/{len(files)}] {f.name}")
+
+                if success:
+                    successful += 1
+                    print(f"  ✓ {msg}")
+                else:
+                    failed += 1
+                    print(f"  ✗ {msg}")
 
     print()
     print("=" * 60)
@@ -19,36 +19,119 @@ The script preserves all OME-XML metadata including pixel sizes.
 """
 
 import argparse
+import queue
+import string
 import sys
+import threading
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 import numpy as np
 import tifffile
 
+from cellprofiler_tools.common import available_cpus, scan_files
+from cellprofiler_tools.converters.tiff_io import (
+    DEFAULT_TILE_SIZE,
+    advise_sequential,
+    drop_input_cache,
+    iter_prefetched,
+    prefetch,
+    resolve_tile_size,
+)
+
+# Matches Pixels in any OME schema namespace (or none) in a single walk
+PIXELS_PATH = ".//{*}Pixels"
+
+# Fast levels with a good ratio on microscopy data; zstd 1-5 favours speed,
+# 10-15 is balanced and 19-22 is archival
+DEFAULT_COMPRESSION_LEVELS = {"zstd": 3, "deflate": 4, "zlib": 4}
+
+# Minimal OME-XML for single-channel output, filled per file
+OME_XML_TEMPLATE = string.Template("""<?xml version="1.0" encoding="UTF-8"?>
+<OME xmlns="http://www.openmicroscopy.org/Schemas/OME/2016-06">
+  <Image ID="Image:0" Name="$channel_name">
+    <Pixels DimensionOrder="XYCZT" ID="Pixels:0"
+            PhysicalSizeX="$phys_x" PhysicalSizeXUnit="$unit"
+            PhysicalSizeY="$phys_y" PhysicalSizeYUnit="$unit"
+            SizeC="1" SizeT="1" SizeZ="1"
+            Type="$dtype">
+      <Channel ID="Channel:0:0" Name="$channel_label" SamplesPerPixel="1"/>
+    </Pixels>
+  </Image>
+</OME>""")
+
+
+def get_compressionargs(compression: str | None, level: int | None = None) -> dict | None:
+    """
+    Build tifffile compressionargs; LZW and uncompressed take no level.
+
+    If level is None the codec's entry in DEFAULT_COMPRESSION_LEVELS is used.
+    """
+    if compression in DEFAULT_COMPRESSION_LEVELS:
+        return {"level": level or DEFAULT_COMPRESSION_LEVELS[compression]}
+    return None
+
+
+def iter_channel_tiles(image, channel: int, tile_size: int):
+    """
+    Yield single-channel tiles in the order TiffWriter expects.
+
+    Leading dimensions (Z or T) are written as successive pages, each
+    split into row-major tiles. Each row of tiles is read as one band with
+    the channel selected in the read, so input strips wider than a tile
+    are decoded once instead of once per tile, and the other channels are
+    never copied.
+    """
+    height = image.shape[-3]
+    # Slicing a zarr-backed image decodes it, so only memmaps are prefetched
+    mapped = isinstance(image, np.ndarray)
+    for plane in np.ndindex(image.shape[:-3]):
+        for y in range(0, height, tile_size):
+            # Memory-mapped input: fetch the next band while this one is encoded
+            if mapped:
+                prefetch(image[plane + (slice(y + tile_size, y + 2 * tile_size), slice(None), channel)])
+            band = np.asarray(image[plane + (slice(y, y + tile_size), slice(None), channel)])
+            for x in range(0, band.shape[1], tile_size):
+                yield band[:, x:x + tile_size]
+
+
+def iter_queue(pending: queue.Queue):
+    """Yield items from a queue until the None sentinel arrives."""
+    while (item := pending.get()) is not None:
+        yield item
+
 
 def extract_channel_from_tiff(
     input_path: Path,
     output_dir: Path,
-    channel: int = 1,  # 0=R, 1=G, 2=B
-    compression: str = "deflate",
-    tile_size: int = 512,
+    channel: int | list[int] = 1,  # 0=R, 1=G, 2=B
+    compression: str = "zstd",
+    compression_level: int | None = None,
+    tile_size: int | None = None,
+    maxworkers: int | None = None,
     dry_run: bool = False,
     verbose: bool = False,
 ) -> tuple[bool, str]:
     """
-    Extract a single channel from an RGB TIFF file.
+    Extract one or more channels from an RGB TIFF file.
+
+    Several channels are split from a single read of the input: each RGB
+    tile is decoded once and its planes are fanned out to one writer thread
+    per output file.
 
     Preserves OME-XML metadata (pixel sizes, objective info, etc.)
     """
+    channels = [channel] if isinstance(channel, int) else list(channel)
     channel_names = {0: "red", 1: "green", 2: "blue"}
-    channel_name = channel_names.get(channel, f"ch{channel}")
-
-    output_name = f"{input_path.stem}_{channel_name}.ome.tiff"
-    output_path = output_dir / output_name
+    names = [channel_names.get(c, f"ch{c}") for c in channels]
+    output_paths = [output_dir / f"{input_path.stem}_{name}.ome.tiff" for name in names]
 
     if dry_run:
-        return True, f"Would extract channel {channel} ({channel_name}): {input_path} -> {output_path}"
+        return True, "\n".join(
+            f"Would extract channel {c} ({name}): {input_path} -> {path}"
+            for c, name, path in zip(channels, names, output_paths)
+        )
 
     try:
         with tifffile.TiffFile(input_path) as tif:
@@ -59,6 +142,11 @@ def extract_channel_from_tiff(
             if len(shape) < 3 or shape[-1] not in [3, 4]:
                 return False, f"Not an RGB image (shape: {shape})"
 
+            if any(c >= shape[-1] for c in channels):
+                return False, f"Channel out of range for {shape[-1]}-channel image: {channels}"
+
+            tile_size = resolve_tile_size(page, tile_size)
+
             if verbose:
                 print(f"  Input shape: {shape}, dtype: {page.dtype}")
 
@@ -69,59 +157,145 @@ def extract_channel_from_tiff(
                 if verbose:
                     print(f"  Found OME metadata")
 
-            # Read the image data
-            # For very large files, we'd want to do this tile by tile,
-            # but for now let's read the whole thing
-            data = page.asarray()
-
-            # Extract the channel
-            if len(data.shape) == 3:  # HxWxC
-                channel_data = data[:, :, channel]
-            elif len(data.shape) == 4:  # ZxHxWxC or TxHxWxC
-                channel_data = data[:, :, :, channel]
-            else:
-                return False, f"Unexpected shape: {data.shape}"
+            # HxWxC, or ZxHxWxC / TxHxWxC. Building series re-parses the
+            # OME-XML inside tifffile, so only do it for multi-page images
+            single_page = len(tif.pages) == 1
+            image_shape = shape if single_page else tif.series[0].shape
+            if len(image_shape) not in (3, 4):
+                return False, f"Unexpected shape: {image_shape}"
 
+            channel_shape = image_shape[:-1]
             if verbose:
-                print(f"  Extracted channel shape: {channel_data.shape}")
-
-            # Update OME-XML metadata to reflect single channel
-            metadata = {}
-            if ome_xml:
-                try:
-                    metadata = update_ome_for_single_channel(ome_xml, channel, channel_name)
-                except Exception as e:
-                    if verbose:
-                        print(f"  Warning: Could not update OME-XML: {e}")
-                    # Continue without updated metadata
+                print(f"  Extracted channel shape: {channel_shape}")
 
             # Create output directory
             output_dir.mkdir(parents=True, exist_ok=True)
 
-            # Write the output
-            write_kwargs = {
-                "bigtiff": True,
-                "tile": (tile_size, tile_size),
-                "compression": compression,
-                "photometric": "minisblack",  # Grayscale
-            }
+            # Compression threads are shared between the output files
+            threads = max(1, (maxworkers or available_cpus()) // len(channels))
+
+            all_write_kwargs = []
+            for c, name in zip(channels, names):
+                # Update OME-XML metadata to reflect single channel
+                metadata = {}
+                if ome_xml:
+                    try:
+                        metadata = update_ome_for_single_channel(ome_xml, c, name)
+                    except Exception as e:
+                        if verbose:
+                            print(f"  Warning: Could not update OME-XML: {e}")
+                        # Continue without updated metadata
+
+                write_kwargs = {
+                    "shape": channel_shape,
+                    "dtype": page.dtype,
+                    "tile": (tile_size, tile_size),
+                    "compression": compression,
+                    "compressionargs": get_compressionargs(compression, compression_level),
+                    # Horizontal differencing, applied per tile before compression
+                    "predictor": compression is not None,
+                    "photometric": "minisblack",  # Grayscale
+                    "maxworkers": threads,
+                }
+
+                # Add resolution if available
+                if "resolution" in metadata:
+                    write_kwargs["resolution"] = metadata["resolution"]
+                    write_kwargs["resolutionunit"] = metadata["resolutionunit"]
+
+                # Add OME-XML description if available
+                if "description" in metadata:
+                    write_kwargs["description"] = metadata["description"]
+
+                all_write_kwargs.append(write_kwargs)
+
+            # Memory-map uncompressed single-page images; otherwise open
+            # a zarr array so tiles are decoded on demand
+            store = None
+            if single_page and page.is_memmappable:
+                data = page.asarray(out='memmap')
+                advise_sequential(tif, data)
+            else:
+                # zarr takes ~0.3 s to import; memory-mapped inputs never need it
+                import zarr
+
+                advise_sequential(tif)
+                store = page.aszarr() if single_page else tif.aszarr()
+                data = zarr.open(store, mode='r')
+                if not hasattr(data, 'shape'):
+                    data = data['0']
+
+            # Stream one tile at a time from input to output
+            try:
+                if len(channels) == 1:
+                    with tifffile.TiffWriter(output_paths[0], bigtiff=True) as tw:
+                        tiles = iter_prefetched(iter_channel_tiles(data, channels[0], tile_size))
+                        tw.write(tiles, **all_write_kwargs[0])
+                else:
+                    write_channels(data, channels, tile_size, output_paths, all_write_kwargs)
+            finally:
+                if store is not None:
+                    store.close()
+                # Unmap the input so its cached pages can be dropped
+                del data
+                drop_input_cache(tif)
+
+            size_mb = sum(path.stat().st_size for path in output_paths) / (1024 * 1024)
+            return True, f"Created {', '.join(str(path) for path in output_paths)} ({size_mb:.1f} MB)"
 
-            # Add resolution if available
-            if "resolution" in metadata:
-                write_kwargs["resolution"] = metadata["resolution"]
-                write_kwargs["resolutionunit"] = metadata["resolutionunit"]
+    except Exception as e:
+        return False, f"Error: {e}"
 
-            # Add OME-XML description if available
-            if "description" in metadata:
-                write_kwargs["description"] = metadata["description"]
 
-            tifffile.imwrite(output_path, channel_data, **write_kwargs)
+def write_channels(data, channels: list[int], tile_size: int, output_paths: list[Path],
+                   all_write_kwargs: list[dict]) -> None:
+    """
+    Write several channels of an image, reading each RGB tile only once.
 
-            size_mb = output_path.stat().st_size / (1024 * 1024)
-            return True, f"Created {output_path} ({size_mb:.1f} MB)"
+    The calling thread reads rows of tiles and hands each plane to a bounded
+    queue per output; one writer thread per output drains its queue into
+    its own TiffWriter. A failed writer keeps draining so the reader never
+    blocks, and its error is re-raised once all writers have finished.
+    """
+    queues = [queue.Queue(maxsize=4) for _ in channels]
+    errors = []
+
+    def write(path, write_kwargs, pending):
+        try:
+            with tifffile.TiffWriter(path, bigtiff=True) as tw:
+                tw.write(iter_queue(pending), **write_kwargs)
+        except Exception as e:
+            errors.append(e)
+            for _ in iter_queue(pending):
+                pass
+
+    writers = [
+        threading.Thread(target=write, args=args, daemon=True)
+        for args in zip(output_paths, all_write_kwargs, queues)
+    ]
+    for writer in writers:
+        writer.start()
 
-    except Exception as e:
-        return False, f"Error: {e}"
+    try:
+        height, width = data.shape[-3], data.shape[-2]
+        mapped = isinstance(data, np.ndarray)
+        for plane in np.ndindex(data.shape[:-3]):
+            for y in range(0, height, tile_size):
+                # One band per row of tiles, so wide strips are decoded once
+                if mapped:
+                    prefetch(data[plane + (slice(y + tile_size, y + 2 * tile_size),)])
+                band = np.asarray(data[plane + (slice(y, y + tile_size),)])
+                for x in range(0, width, tile_size):
+                    for c, pending in zip(channels, queues):
+                        pending.put(band[:, x:x + tile_size, c])
+    finally:
+        for pending in queues:
+            pending.put(None)
+        for writer in writers:
+            writer.join()
+
+    if errors:
+        raise errors[0]
 
 
 def update_ome_for_single_channel(ome_xml: str, channel_idx: int, channel_name: str) -> dict:
@@ -140,12 +314,9 @@ def update_ome_for_single_channel(ome_xml: str, channel_idx: int, channel_name:
             ome_xml = ome_xml[xml_start:]
 
         root = ET.fromstring(ome_xml)
-        ns = {"ome": "http://www.openmicroscopy.org/Schemas/OME/2016-06"}
 
         # Find Pixels element
-        pixels = root.find(".//ome:Pixels", ns)
-        if pixels is None:
-            pixels = root.find(".//Pixels")
+        pixels = root.find(PIXELS_PATH)
 
         if pixels is not None:
             # Get physical sizes
@@ -174,19 +345,14 @@ def update_ome_for_single_channel(ome_xml: str, channel_idx: int, channel_name:
             # This preserves pixel size info that CellProfiler can read
             # Note: Use "um" instead of "µm" for ASCII compatibility
             unit_ascii = "um" if unit_x in ["µm", "um", "micron"] else unit_x
-            desc = f"""<?xml version="1.0" encoding="UTF-8"?>
-<OME xmlns="http://www.openmicroscopy.org/Schemas/OME/2016-06">
-  <Image ID="Image:0" Name="{channel_name}">
-    <Pixels DimensionOrder="XYCZT" ID="Pixels:0"
-            PhysicalSizeX="{phys_x}" PhysicalSizeXUnit="{unit_ascii}"
-            PhysicalSizeY="{phys_y}" PhysicalSizeYUnit="{unit_ascii}"
-            SizeC="1" SizeT="1" SizeZ="1"
-            Type="{pixels.get('Type', 'uint8')}">
-      <Channel ID="Channel:0:0" Name="{channel_name.capitalize()}" SamplesPerPixel="1"/>
-    </Pixels>
-  </Image>
-</OME>"""
-            metadata["description"] = desc
+            metadata["description"] = OME_XML_TEMPLATE.substitute(
+                channel_name=channel_name,
+                channel_label=channel_name.capitalize(),
+                phys_x=phys_x,
+                phys_y=phys_y,
+                unit=unit_ascii,
+                dtype=pixels.get("Type", "uint8"),
+            )
 
     except ET.ParseError:
         pass
@@ -194,18 +360,28 @@ def update_ome_for_single_channel(ome_xml: str, channel_idx: int, channel_name:
     return metadata
 
 
-def find_tiff_files(root_dir: Path, recursive: bool = True) -> list[Path]:
-    """Find all TIFF files in directory."""
-    patterns = ["*.ome.tiff", "*.ome.tif", "*.tiff", "*.tif"]
-    files = []
+def check_rgb_tiff(input_path: Path) -> tuple[bool, str]:
+    """
+    Cheaply check that a TIFF's first page is RGB(A).
+
+    Only the first page header is read: the OME-XML is never parsed and
+    multi-file OME references are not followed. Returns (is_rgb, message).
+    """
+    try:
+        with tifffile.TiffFile(input_path, _multifile=False) as tif:
+            shape = tif.pages[0].shape
+    except Exception as e:
+        return False, f"Could not read TIFF header: {e}"
 
-    for pattern in patterns:
-        if recursive:
-            files.extend(root_dir.glob(f"**/{pattern}"))
-        else:
-            files.extend(root_dir.glob(pattern))
+    if len(shape) < 3 or shape[-1] not in [3, 4]:
+        return False, f"Not an RGB image (shape: {shape})"
+    return True, "RGB"
 
-    return sorted(set(files))
+
+def find_tiff_files(root_dir: Path, recursive: bool = True) -> list[Path]:
+    """Find all TIFF files in directory (single walk, case-insensitive)."""
+    suffixes = (".tif", ".tiff")
+    return sorted(Path(e.path) for e in scan_files(root_dir, recursive) if e.name.lower().endswith(suffixes))
 
 
 def main():
@@ -227,8 +403,10 @@ def main():
     parser.add_argument(
         "--channel",
         type=int,
-        default=1,
-        help="Channel to extract (0=Red, 1=Green, 2=Blue). Default: 1 (green)"
+        nargs="+",
+        default=[1],
+        help="Channel(s) to extract (0=Red, 1=Green, 2=Blue); several channels "
+             "are split from one read of each file. Default: 1 (green)"
     )
     parser.add_argument(
         "--green", "-g",
@@ -247,15 +425,35 @@ def main():
     )
     parser.add_argument(
         "--compression",
-        choices=["deflate", "lzw", "zlib", "none"],
-        default="deflate",
-        help="Compression type (default: deflate)"
+        choices=["zstd", "deflate", "lzw", "zlib", "none"],
+        default="zstd",
+        help="Compression type (default: zstd)"
+    )
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        default=None,
+        help="Compression level: zstd 1-22 (default: 3; 1-5 fast, 10-15 balanced, "
+             "19-22 archival), deflate/zlib 1-12 (default: 4)"
     )
     parser.add_argument(
         "--tile-size",
         type=int,
-        default=512,
-        help="Tile size (default: 512)"
+        default=None,
+        help=f"Tile size, rounded up to a multiple of 16 "
+             f"(default: match input tiles, else {DEFAULT_TILE_SIZE})"
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=None,
+        help="Number of files to process in parallel (default: half the CPUs)"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Threads for parallel tile compression per file (default: CPUs / jobs)"
     )
     parser.add_argument(
         "--recursive", "-r",
@@ -275,17 +473,13 @@ def main():
 
     args = parser.parse_args()
 
-    # Handle channel shortcuts
-    channel = args.channel
-    if args.green:
-        channel = 1
-    elif args.red:
-        channel = 0
-    elif args.blue:
-        channel = 2
+    # Handle channel shortcuts; they can be combined
+    shortcuts = [(args.red, 0), (args.green, 1), (args.blue, 2)]
+    channels = [c for selected, c in shortcuts if selected] or args.channel
 
     channel_names = {0: "Red", 1: "Green", 2: "Blue"}
-    print(f"Extracting {channel_names.get(channel, f'channel {channel}')} channel")
+    labels = [channel_names.get(c, f"channel {c}") for c in channels]
+    print(f"Extracting {', '.join(labels)} channel{'s' if len(channels) > 1 else ''}")
 
     # Find input files
     if args.input_path.is_file():
@@ -305,30 +499,60 @@ def main():
         print("DRY RUN - no files will be created")
     print()
 
+    # Reject non-RGB inputs from their first page header alone, before any
+    # worker opens them in full
+    rejected = {}
+    for f in files:
+        is_rgb, msg = check_rgb_tiff(f)
+        if not is_rgb:
+            rejected[f] = msg
+            print(f"  ✗ {f.name}: {msg}")
+    if rejected:
+        files = [f for f in files if f not in rejected]
+        print(f"Skipping {len(rejected)} non-RGB file(s)")
+        print()
+
+    # Split CPUs between concurrent files and per-file compression threads
+    cpus = available_cpus()
+    jobs = args.jobs or max(1, min(cpus // 2, len(files)))
+    threads = args.threads or max(1, cpus // jobs)
+    if jobs > 1:
+        print(f"Processing {jobs} files in parallel ({threads} threads each)")
+        print()
+
     successful = 0
-    failed = 0
+    failed = len(rejected)
 
     compression = args.compression if args.compression != "none" else None
 
-    for i, f in enumerate(files, 1):
-        print(f"[{i}/{len(files)}] {f.name}")
-
-        success, msg = extract_channel_from_tiff(
-            f,
-            args.output_dir,
-            channel=channel,
-            compression=compression,
-            tile_size=args.tile_size,
-            dry_run=args.dry_run,
-            verbose=args.verbose,
-        )
-
-        if success:
-            successful += 1
-            print(f"  ✓ {msg}")
-        else:
-            failed += 1
-            print(f"  ✗ {msg}")
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(
+                extract_channel_from_tiff,
+                f,
+                args.output_dir,
+                channel=channels,
+                compression=compression,
+                compression_level=args.compression_level,
+                tile_size=args.tile_size,
+                maxworkers=threads,
+                dry_run=args.dry_run,
+                verbose=args.verbose,
+            ): f
+            for f in files
+        }
+
+        for i, future in enumerate(as_completed(futures), 1):
+            f = futures[future]
+            success, msg = future.result()
+            print(f"[{i}/{len(files)}] {f.name}")
+
+            if success:
+                successful += 1
+                print(f"  ✓ {msg}")
+            else:
+                failed += 1
+                print(f"  ✗ {msg}")
 
     print()
     print("=" * 60)
@@ -0,0 +1,131 @@
+"""
+Input-side TIFF helpers shared by the channel converters.
+
+Output tile sizing, page cache hints for the input file, and a background
+reader thread that overlaps input decoding with compression.
+"""
+
+import mmap
+import os
+import queue
+import threading
+
+import numpy as np
+import tifffile
+from numpy.lib.array_utils import byte_bounds
+
+# Tiles or bands queued between the reader thread and the consumer
+PREFETCH_DEPTH = 4
+
+# 1024x1024 tiles (1-2 MB) amortize per-tile codec setup and let zstd use
+# its large-window parameters
+DEFAULT_TILE_SIZE = 1024
+
+# Smaller tiles spend more time in per-tile codec and thread-pool overhead
+# than in compression, so native tiles below this are grown
+MIN_TILE_BYTES = 128 * 1024
+
+
+def resolve_tile_size(page: tifffile.TiffPage, tile_size: int | None = None) -> int:
+    """
+    Pick the output tile edge length.
+
+    Without an explicit size, tiled inputs keep their native tile width
+    (doubled until a tile holds at least MIN_TILE_BYTES, staying aligned to
+    the input grid) and strip-based inputs use DEFAULT_TILE_SIZE. TIFF
+    requires tile dimensions to be multiples of 16, so the size is rounded
+    up to one.
+    """
+    if tile_size is None:
+        tile_size = page.tilewidth or DEFAULT_TILE_SIZE
+        while tile_size * tile_size * page.dtype.itemsize < MIN_TILE_BYTES:
+            tile_size *= 2
+    return max(16, -(-tile_size // 16) * 16)
+
+
+def advise_sequential(tif: tifffile.TiffFile, array=None) -> None:
+    """
+    Hint the kernel that the input is read front to back.
+
+    POSIX_FADV_SEQUENTIAL enlarges readahead for the file (on NFS/Lustre
+    this widens the RPC window); a memory-mapped image also gets
+    MADV_SEQUENTIAL. No-op on platforms without these calls.
+    """
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(tif.filehandle.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+    # np.memmap views chain back to the mmap through .base
+    base = array
+    while base is not None and not isinstance(base, mmap.mmap):
+        base = getattr(base, "base", None)
+    if base is not None and hasattr(mmap, "MADV_SEQUENTIAL"):
+        base.madvise(mmap.MADV_SEQUENTIAL)
+
+
+def prefetch(array) -> None:
+    """
+    Start reading a memory-mapped array's pages in the background.
+
+    MADV_WILLNEED queues readahead for just the array's byte range, so a
+    band is already in the page cache by the time its tiles are read. No-op
+    for arrays that are not memory-mapped.
+    """
+    base = array
+    while base is not None and not isinstance(base, mmap.mmap):
+        base = getattr(base, "base", None)
+    if base is None or array.size == 0 or not hasattr(mmap, "MADV_WILLNEED"):
+        return
+    low, high = byte_bounds(array)
+    origin = np.frombuffer(base, dtype=np.uint8).ctypes.data
+    start = (low - origin) // mmap.PAGESIZE * mmap.PAGESIZE
+    base.madvise(mmap.MADV_WILLNEED, start, high - origin - start)
+
+
+def drop_input_cache(tif: tifffile.TiffFile) -> None:
+    """Evict the input's pages from the page cache once it has been read."""
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(tif.filehandle.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def iter_prefetched(items, depth: int = PREFETCH_DEPTH):
+    """
+    Pull items from an iterator on a background reader thread.
+
+    Reading input tiles or bands (decoding compressed segments, or page
+    faults on a memmap) then overlaps with compression and writing on the
+    calling thread. At most depth items are queued.
+    """
+    pending = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+    errors = []
+
+    def put(item) -> bool:
+        # Give up if the consumer has gone away, so the thread always exits
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except Exception as e:
+            errors.append(e)
+        put(done)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    try:
+        while (item := pending.get()) is not done:
+            yield item
+        if errors:
+            raise errors[0]
+    finally:
+        stop.set()
+        reader.join()
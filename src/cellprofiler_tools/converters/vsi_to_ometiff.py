@@ -37,12 +37,14 @@ SAFETY: This script ONLY reads from source and writes to output_dir.
 """
 
 import argparse
-import os
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Optional
 
+from cellprofiler_tools.common import scan_files
+
 
 # Default path to bfconvert - can be overridden with --bfconvert
 DEFAULT_BFCONVERT = Path.home() / "bin" / "bftools" / "bftools" / "bfconvert"
@@ -57,12 +59,8 @@ def is_same_filesystem(path1: Path, path2: Path) -> bool:
 
 
 def find_vsi_files(root_dir: Path, recursive: bool = True) -> list[Path]:
-    """Find all VSI files in directory."""
-    pattern = "**/*.vsi" if recursive else "*.vsi"
-    files = list(root_dir.glob(pattern))
-    # Also check for uppercase
-    files.extend(root_dir.glob(pattern.replace(".vsi", ".VSI")))
-    return sorted(set(files))
+    """Find all VSI files in directory (single walk, case-insensitive)."""
+    return sorted(Path(e.path) for e in scan_files(root_dir, recursive) if e.name.lower().endswith(".vsi"))
 
 
 def get_series_info(vsi_path: Path, bfconvert_dir: Path) -> list[dict]:
@@ -107,7 +105,7 @@ def convert_vsi_to_ometiff(
     bfconvert: Path,
     series: Optional[int] = None,
     compression: str = "LZW",
-    tile_size: int = 512,
+    tile_size: int = 1024,
     dry_run: bool = False,
     verbose: bool = False
 ) -> tuple[bool, str]:
@@ -216,8 +214,15 @@ def main():
     parser.add_argument(
         "--tile-size",
         type=int,
-        default=512,
-        help="Tile size for output (default: 512)"
+        default=1024,
+        help="Tile size for output (default: 1024)"
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=1,
+        help="Number of bfconvert processes to run in parallel (default: 1; "
+             "each runs its own JVM, so mind memory)"
     )
     parser.add_argument(
         "--recursive", "-r",
@@ -301,26 +306,34 @@ def main():
     failed = 0
     series_arg = args.series if args.series >= 0 else None
 
-    for i, vsi_file in enumerate(vsi_files, 1):
-        print(f"[{i}/{len(vsi_files)}] {vsi_file.name}")
-
-        success, message = convert_vsi_to_ometiff(
-            vsi_file,
-            args.output_dir,
-            args.bfconvert,
-            series=series_arg,
-            compression=args.compression,
-            tile_size=args.tile_size,
-            dry_run=args.dry_run,
-            verbose=args.verbose
-        )
-
-        if success:
-            successful += 1
-            print(f"  ✓ {message}")
-        else:
-            failed += 1
-            print(f"  ✗ {message}")
+    # Each conversion is a bfconvert subprocess, so threads are enough to
+    # run several at once
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = {
+            executor.submit(
+                convert_vsi_to_ometiff,
+                vsi_file,
+                args.output_dir,
+                args.bfconvert,
+                series=series_arg,
+                compression=args.compression,
+                tile_size=args.tile_size,
+                dry_run=args.dry_run,
+                verbose=args.verbose
+            ): vsi_file
+            for vsi_file in vsi_files
+        }
+
+        for i, future in enumerate(as_completed(futures), 1):
+            success, message = future.result()
+            print(f"[{i}/{len(vsi_files)}] {futures[future].name}")
+
+            if success:
+                successful += 1
+                print(f"  ✓ {message}")
+            else:
+                failed += 1
+                print(f"  ✗ {message}")
 
     print()
     print("=" * 60)
@@ -0,0 +1,60 @@
+"""Round-trip tests for btf_to_green's pre-encoded tile writer."""
+
+import numpy as np
+import pytest
+import tifffile
+
+from cellprofiler_tools.converters import btf_to_green
+
+
+@pytest.mark.parametrize("process", [btf_to_green.process_btf_file_chunked, btf_to_green.process_btf_file])
+@pytest.mark.parametrize("dtype", [np.uint16, np.float32])
+def test_channel_round_trip(tmp_path, process, dtype):
+    rng = np.random.default_rng(0)
+    image = (rng.random((300, 500, 3)) * 1000).astype(dtype)
+    input_path = tmp_path / "image.btf"
+    tifffile.imwrite(input_path, image, photometric="rgb", tile=(128, 128), compression="zlib")
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+
+    # Tiles smaller than the image exercise both full and padded edge tiles
+    success, msg = process(input_path, output_dir, tile_size=256, maxworkers=2, channel=1)
+    assert success, msg
+
+    (output_path,) = output_dir.glob("*.tiff")
+    with tifffile.TiffFile(output_path) as tif:
+        assert tif.pages[0].predictor == btf_to_green.get_predictor(dtype)
+        result = tif.pages[0].asarray()
+    assert result.dtype == dtype
+    np.testing.assert_array_equal(result, image[:, :, 1])
+
+
+def test_uint8_keeps_float_input(tmp_path):
+    # 0-1 normalized data has no fixed bit depth to drop, so it is not rescaled
+    rng = np.random.default_rng(2)
+    image = rng.random((300, 500, 3)).astype(np.float32)
+    input_path = tmp_path / "image.btf"
+    tifffile.imwrite(input_path, image, photometric="rgb", tile=(128, 128), compression="zlib")
+
+    success, msg = btf_to_green.process_btf_file_chunked(
+        input_path, tmp_path, tile_size=256, maxworkers=2, channel=1, clip_percentiles=(0.1, 99.9)
+    )
+    assert success, msg
+    np.testing.assert_array_equal(tifffile.imread(tmp_path / "image_green.ome.tiff"), image[:, :, 1])
+
+
+# Segments aligned to the bands, and tiles or strips that straddle them
+@pytest.mark.parametrize("segments", [{"tile": (64, 64)}, {"tile": (48, 48)}, {"rowsperstrip": 40}])
+def test_segment_bands_recycle_buffers(tmp_path, segments):
+    # Many narrow bands, so the band buffer ring wraps around several times
+    # while earlier tiles are still queued for encoding
+    rng = np.random.default_rng(1)
+    image = rng.integers(0, 4096, (1200, 500, 3), dtype=np.uint16)
+    input_path = tmp_path / "image.btf"
+    tifffile.imwrite(input_path, image, photometric="rgb", compression="zlib", **segments)
+
+    success, msg = btf_to_green.process_btf_file_chunked(
+        input_path, tmp_path, tile_size=64, maxworkers=2, channel=1, chunk_rows=64
+    )
+    assert success, msg
+    np.testing.assert_array_equal(tifffile.imread(tmp_path / "image_green.ome.tiff"), image[:, :, 1])